@@ -0,0 +1,67 @@
+import os
+import re
+import sys
+import random
+import timeit
+import argparse
+
+from generate_data import COMPANY_SUFFIX_VARIANTS, COMPANY_TRADES, COMPANY_WORDS
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import blankcheck
+
+# --- CONFIGURATION ---
+DEFAULT_VALUES = 20_000
+DEFAULT_REPEAT = 5
+
+# --- Before: one re.sub per step and per suffix, as the scripts normalized company names before the shared pipeline ---
+
+def normalize_name_before(value):
+    value = value.lower().strip()
+    value = re.sub(r'[.,\/#!$%\^&\*;:{}=\-_`~()]', '', value)
+    value = re.sub(r'\s+', ' ', value)
+    value = re.sub(r'\blimited\b|\bltd\b', 'limited', value, flags=re.IGNORECASE)
+    value = re.sub(r'\bincorporated\b|\binc\b', 'incorporated', value, flags=re.IGNORECASE)
+    value = re.sub(r'\bcompany\b|\bco\b', 'company', value, flags=re.IGNORECASE)
+    value = re.sub(r'\bsolutions\b|\bsolns\b', 'solutions', value, flags=re.IGNORECASE)
+    value = re.sub(r'\bgroup\b|\bgrp\b', 'group', value, flags=re.IGNORECASE)
+    return value.strip()
+
+# --- Harness ---
+
+def suffix_heavy_names(count, seed):
+    """Company names ending in one or two legal suffixes, with trade words that are suffixes too (Solutions, Group)."""
+    rng = random.Random(seed)
+    trades = COMPANY_TRADES + ['Solutions', 'Solns', 'Group', 'Grp']
+    names = []
+    for _ in range(count):
+        suffixes = [rng.choice(rng.choice(COMPANY_SUFFIX_VARIANTS)) for _ in range(rng.randint(1, 2))]
+        names.append(' '.join([rng.choice(COMPANY_WORDS), rng.choice(trades), *suffixes]))
+    return names
+
+def microseconds_per_value(function, values, repeat, setup=None):
+    """The best of repeat passes over values, in microseconds per value; setup runs before every pass."""
+    def one_pass():
+        if setup:
+            setup()
+        for value in values:
+            function(value)
+    return min(timeit.repeat(one_pass, number=1, repeat=repeat)) / len(values) * 1e6
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Times company-name normalization on generated suffix-heavy names, before and after the shared normalization pipeline.")
+    parser.add_argument("--values", type=int, default=DEFAULT_VALUES, help=f"Number of names to normalize per pass. (Default: {DEFAULT_VALUES})")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help=f"Passes per measurement; the fastest is reported. (Default: {DEFAULT_REPEAT})")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the generated names. (Default: 0)")
+    args = parser.parse_args()
+
+    names = suffix_heavy_names(args.values, args.seed)
+    normalize_name = lambda value: blankcheck.normalize_value('company_name__c', value)
+    timings = [
+        ("before (re.sub per step)", microseconds_per_value(normalize_name_before, names, args.repeat)),
+        ("normalize_value, cold cache", microseconds_per_value(normalize_name, names, args.repeat, setup=blankcheck.normalize_name.cache_clear)),
+        ("normalize_value, warm cache", microseconds_per_value(normalize_name, names, args.repeat)),
+    ]
+    print(f"{len(names)} suffix-heavy names, e.g. {names[0]!r}")
+    for label, microseconds in timings:
+        print(f"{label:<30} {microseconds:6.2f} us/value")
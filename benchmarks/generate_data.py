@@ -0,0 +1,180 @@
+import csv
+import random
+import argparse
+
+# --- CONFIGURATION ---
+SIZE_PRESETS = {'10k': 10_000, '100k': 100_000, '1m': 1_000_000}
+DEFAULT_DUPLICATE_RATE = 0.3  # Share of rows that are extra copies of an earlier entity
+DEFAULT_TYPO_RATE = 0.3       # Chance that a copied text field gets a typo
+DEFAULT_MISSING_RATE = 0.1    # Chance that an optional field is left empty
+SURNAME_SKEW = 1.1            # Zipf exponent for the surname distribution; higher means a few surnames dominate
+
+HEADERS = {
+    'contact': ['Id', 'Name', 'Email', 'Company_Name__c', 'Phone', 'MailingPostalCode', 'MailingCountry'],
+    'account': ['Id', 'Name', 'Website', 'Phone', 'BillingPostalCode', 'BillingCountry'],
+}
+
+FIRST_NAMES = [
+    'James', 'Mary', 'John', 'Patricia', 'Robert', 'Jennifer', 'Michael', 'Linda', 'William', 'Elizabeth',
+    'David', 'Barbara', 'Richard', 'Susan', 'Joseph', 'Jessica', 'Thomas', 'Sarah', 'Charles', 'Karen',
+    'Christopher', 'Nancy', 'Daniel', 'Lisa', 'Matthew', 'Margaret', 'Anthony', 'Sandra', 'Mark', 'Ashley',
+    'Steven', 'Emily', 'Paul', 'Donna', 'Andrew', 'Michelle', 'Joshua', 'Carol', 'Kenneth', 'Amanda',
+    'Oliver', 'Amelia', 'Harry', 'Isla', 'George', 'Ava', 'Noah', 'Mia', 'Jack', 'Grace',
+]
+# Ordered from most to least common; weights follow a Zipf curve so blocks on common surnames get large
+SURNAMES = [
+    'Smith', 'Jones', 'Williams', 'Taylor', 'Brown', 'Davies', 'Evans', 'Wilson', 'Thomas', 'Johnson',
+    'Roberts', 'Robinson', 'Thompson', 'Wright', 'Walker', 'White', 'Edwards', 'Hughes', 'Green', 'Hall',
+    'Lewis', 'Harris', 'Clarke', 'Patel', 'Jackson', 'Wood', 'Turner', 'Martin', 'Cooper', 'Hill',
+    'Ward', 'Morris', 'Moore', 'Clark', 'Lee', 'King', 'Baker', 'Harrison', 'Morgan', 'Allen',
+    'James', 'Scott', 'Phillips', 'Watson', 'Davis', 'Parker', 'Price', 'Bennett', 'Young', 'Griffiths',
+    'Mitchell', 'Kelly', 'Cook', 'Carter', 'Richardson', 'Bailey', 'Collins', 'Bell', 'Shaw', 'Murphy',
+    'Miller', 'Cox', 'Richards', 'Khan', 'Marshall', 'Anderson', 'Simpson', 'Ellis', 'Adams', 'Singh',
+    'Begum', 'Wilkinson', 'Foster', 'Chapman', 'Powell', 'Webb', 'Rogers', 'Gray', 'Mason', 'Ali',
+    'Hunt', 'Hussain', 'Campbell', 'Matthews', 'Owen', 'Palmer', 'Holmes', 'Mills', 'Barnes', 'Knight',
+    'Lloyd', 'Butler', 'Russell', 'Barker', 'Fisher', 'Stevens', 'Jenkins', 'Murray', 'Dixon', 'Harvey',
+]
+SURNAME_WEIGHTS = [1 / rank ** SURNAME_SKEW for rank in range(1, len(SURNAMES) + 1)]
+COMPANY_WORDS = [
+    'Acme', 'Globex', 'Initech', 'Umbrella', 'Hooli', 'Stark', 'Wayne', 'Wonka', 'Tyrell', 'Cyberdyne',
+    'Soylent', 'Vandelay', 'Gringotts', 'Oceanic', 'Massive', 'Dynamic', 'Northern', 'Atlas', 'Summit', 'Pioneer',
+    'Apex', 'Vertex', 'Harbour', 'Meridian', 'Crown', 'Silver', 'Granite', 'Beacon', 'Horizon', 'Sterling',
+    'Blue', 'Red', 'Green', 'Bright', 'Swift', 'Union', 'Royal', 'Central', 'Coastal', 'Premier',
+]
+COMPANY_TRADES = ['Solutions', 'Systems', 'Logistics', 'Consulting', 'Foods', 'Engineering', 'Media', 'Health', 'Energy', 'Holdings']
+# Each group lists spellings of the same legal suffix; a duplicate may swap one for another
+COMPANY_SUFFIX_VARIANTS = [
+    ['Ltd', 'Ltd.', 'Limited'],
+    ['Inc', 'Inc.', 'Incorporated'],
+    ['Co', 'Co.', 'Company'],
+    ['Corp', 'Corp.', 'Corporation'],
+    ['Group', 'Grp'],
+    ['PLC', 'plc', 'Public Limited Company'],
+    ['LLC', 'L.L.C.'],
+]
+POSTCODES = ['M1 1AA', 'SW1A 1AA', 'EC1A 1BB', 'B33 8TH', 'CR2 6XH', 'DN55 1PT', 'LS1 4AP', 'G1 1XQ', 'BS1 6QS', 'XX', '']
+COUNTRIES = ['United Kingdom', 'UK', 'GB', 'Ireland', '']
+TYPO_LETTERS = 'abcdefghijklmnopqrstuvwxyz'
+
+# --- Entities ---
+
+def make_entity(kind, entity_id, seed):
+    """
+    Returns the clean record of an entity. It is derived from (seed, entity_id) alone, so copies can be made
+    later without keeping every entity in memory.
+    """
+    rng = random.Random(f"{seed}:{entity_id}")
+    company_words = rng.sample(COMPANY_WORDS, 2 if rng.random() < 0.7 else 1)
+    company_stem = f"{' '.join(company_words)} {rng.choice(COMPANY_TRADES)}"
+    suffix_group = rng.randrange(len(COMPANY_SUFFIX_VARIANTS))
+    domain = f"{company_stem.replace(' ', '').lower()}{entity_id % 997 if rng.random() < 0.5 else ''}.{rng.choice(['com', 'co.uk', 'net', 'org'])}"
+    phone = f"0{rng.randint(1000, 9999)} {rng.randint(100000, 999999)}"
+    entity = {
+        'company': company_stem,
+        'suffix_group': suffix_group,
+        'suffix': COMPANY_SUFFIX_VARIANTS[suffix_group][0],
+        'domain': domain,
+        'phone': phone,
+        'postcode': rng.choice(POSTCODES),
+        'country': rng.choice(COUNTRIES),
+    }
+    if kind == 'contact':
+        entity['first_name'] = rng.choice(FIRST_NAMES)
+        entity['surname'] = rng.choices(SURNAMES, weights=SURNAME_WEIGHTS)[0]
+        entity['email'] = f"{entity['first_name'].lower()}.{entity['surname'].lower()}{rng.randint(1, 99)}@{domain}"
+    return entity
+
+def add_typo(rng, value):
+    """Deletes, inserts, substitutes or swaps one letter of value."""
+    if len(value) < 4:
+        return value
+    i = rng.randrange(1, len(value) - 1)
+    edit = rng.randrange(4)
+    if edit == 0:
+        return value[:i] + value[i + 1:]
+    if edit == 1:
+        return value[:i] + rng.choice(TYPO_LETTERS) + value[i:]
+    if edit == 2:
+        return value[:i] + rng.choice(TYPO_LETTERS) + value[i + 1:]
+    return value[:i - 1] + value[i] + value[i - 1] + value[i + 1:]
+
+def vary_phone(rng, phone):
+    digits = phone.replace(' ', '')
+    return rng.choice([phone, digits, f"+44 {digits[1:]}", f"({digits[:5]}) {digits[5:]}", f"{digits[:5]}-{digits[5:]}"])
+
+def vary_website(rng, domain):
+    return rng.choice([domain, f"www.{domain}", f"http://www.{domain}", f"https://{domain}/", f"https://www.{domain}/home"])
+
+def make_row(kind, entity, rng, is_copy, typo_rate, missing_rate):
+    """Renders an entity as a CSV row. Copies get typos, suffix variants, reformatted fields and gaps."""
+    suffix = entity['suffix']
+    if is_copy and rng.random() < 0.5:
+        suffix = rng.choice(COMPANY_SUFFIX_VARIANTS[entity['suffix_group']])
+    company = f"{entity['company']} {suffix}"
+    phone = vary_phone(rng, entity['phone']) if is_copy else entity['phone']
+    missing = lambda: is_copy and rng.random() < missing_rate
+    typo = lambda value: add_typo(rng, value) if is_copy and rng.random() < typo_rate else value
+    if kind == 'contact':
+        email = entity['email']
+        if is_copy and rng.random() < 0.2:
+            email = email.upper() if rng.random() < 0.5 else typo(email)
+        return {
+            'Name': typo(f"{entity['first_name']} {entity['surname']}"),
+            'Email': '' if missing() else email,
+            'Company_Name__c': '' if missing() else typo(company),
+            'Phone': '' if missing() else phone,
+            'MailingPostalCode': entity['postcode'],
+            'MailingCountry': entity['country'],
+        }
+    return {
+        'Name': typo(company),
+        'Website': '' if missing() else (vary_website(rng, entity['domain']) if is_copy else f"https://www.{entity['domain']}"),
+        'Phone': '' if missing() else phone,
+        'BillingPostalCode': entity['postcode'],
+        'BillingCountry': entity['country'],
+    }
+
+def generate(kind, rows, output_path, truth_path, duplicate_rate=DEFAULT_DUPLICATE_RATE, typo_rate=DEFAULT_TYPO_RATE, missing_rate=DEFAULT_MISSING_RATE, seed=0):
+    """
+    Writes `rows` Salesforce-style rows to output_path and the ground truth (Id, entity_id) to truth_path.
+    Each row is either a new entity or, with probability duplicate_rate, a perturbed copy of an earlier one.
+    Rows are written as they are generated, so memory use does not grow with `rows`.
+    """
+    rng = random.Random(seed)
+    entity_count = 0
+    with open(output_path, mode='w', newline='', encoding='utf-8') as outfile, open(truth_path, mode='w', newline='', encoding='utf-8') as truthfile:
+        writer = csv.DictWriter(outfile, fieldnames=HEADERS[kind])
+        writer.writeheader()
+        truth_writer = csv.writer(truthfile)
+        truth_writer.writerow(['Id', 'entity_id'])
+        for i in range(rows):
+            is_copy = entity_count > 0 and rng.random() < duplicate_rate
+            if is_copy:
+                entity_id = rng.randrange(entity_count)
+            else:
+                entity_id = entity_count
+                entity_count += 1
+            row = make_row(kind, make_entity(kind, entity_id, seed), rng, is_copy, typo_rate, missing_rate)
+            row['Id'] = f"{'003' if kind == 'contact' else '001'}{i:012d}"
+            writer.writerow(row)
+            truth_writer.writerow([row['Id'], entity_id])
+    return entity_count
+
+def parse_size(value):
+    return SIZE_PRESETS.get(value.lower()) or int(value)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generates Contact- or Account/Lead-shaped CSV data with known duplicates for benchmarking.")
+    parser.add_argument("kind", choices=sorted(HEADERS), help="Shape of the generated data.")
+    parser.add_argument("rows", type=parse_size, help="Number of rows, or one of 10k, 100k, 1m.")
+    parser.add_argument("-o", "--output_file", help="Path for the generated CSV. (Default: <kind>_<rows>.csv)")
+    parser.add_argument("--truth", help="Path for the ground-truth CSV of Id and entity_id. (Default: <output>_truth.csv)")
+    parser.add_argument("--duplicate-rate", type=float, default=DEFAULT_DUPLICATE_RATE, help=f"Share of rows that copy an earlier entity. (Default: {DEFAULT_DUPLICATE_RATE})")
+    parser.add_argument("--typo-rate", type=float, default=DEFAULT_TYPO_RATE, help=f"Chance of a typo in each copied text field. (Default: {DEFAULT_TYPO_RATE})")
+    parser.add_argument("--missing-rate", type=float, default=DEFAULT_MISSING_RATE, help=f"Chance that a copied optional field is empty. (Default: {DEFAULT_MISSING_RATE})")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed; the same seed always gives the same file. (Default: 0)")
+    args = parser.parse_args()
+    output_path = args.output_file or f"{args.kind}_{args.rows}.csv"
+    truth_path = args.truth or f"{output_path.rsplit('.', 1)[0]}_truth.csv"
+    entities = generate(args.kind, args.rows, output_path, truth_path, args.duplicate_rate, args.typo_rate, args.missing_rate, args.seed)
+    print(f"Wrote {args.rows} rows for {entities} entities to {output_path} and the ground truth to {truth_path}.")
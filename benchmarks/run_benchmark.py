@@ -0,0 +1,130 @@
+import os
+import sys
+import csv
+import json
+import time
+import argparse
+import platform
+import tempfile
+import subprocess
+from collections import Counter
+from datetime import datetime, timezone
+
+from generate_data import DEFAULT_DUPLICATE_RATE, DEFAULT_TYPO_RATE, generate, parse_size
+
+# --- CONFIGURATION ---
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPTS = {
+    'contact': os.path.join(REPO_DIR, 'accountBlankCheck0.7_Contact.py'),
+    'account': os.path.join(REPO_DIR, 'accountBlankCheck0.5_Account_Lead.py'),
+}
+DEFAULT_SIZES = ['10k']
+
+# --- Accuracy ---
+
+def pair_count(group_sizes):
+    return sum(size * (size - 1) // 2 for size in group_sizes)
+
+def score_clusters(output_path, truth_path):
+    """
+    Pairwise precision and recall of the output's match clusters against the generated entities.
+    Rows without a match_key are clusters of one.
+    """
+    with open(truth_path, newline='', encoding='utf-8') as truth_file:
+        entity_of = {row['Id']: row['entity_id'] for row in csv.DictReader(truth_file)}
+    predicted, truth, joint = Counter(), Counter(), Counter()
+    with open(output_path, newline='', encoding='utf-8') as output_file:
+        for row in csv.DictReader(output_file):
+            cluster = row['match_key'] or f"row:{row['Id']}"
+            entity = entity_of[row['Id']]
+            predicted[cluster] += 1
+            truth[entity] += 1
+            joint[cluster, entity] += 1
+    true_pairs, predicted_pairs, correct_pairs = pair_count(truth.values()), pair_count(predicted.values()), pair_count(joint.values())
+    precision = correct_pairs / predicted_pairs if predicted_pairs else 1.0
+    recall = correct_pairs / true_pairs if true_pairs else 1.0
+    return {
+        'true_pairs': true_pairs,
+        'predicted_pairs': predicted_pairs,
+        'correct_pairs': correct_pairs,
+        'precision': round(precision, 4),
+        'recall': round(recall, 4),
+        'f1': round(2 * precision * recall / (precision + recall), 4) if precision + recall else 0.0,
+    }
+
+# --- Harness ---
+
+def get_git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_benchmark(kind, rows, work_dir, duplicate_rate, typo_rate, seed, script_args):
+    input_path = os.path.join(work_dir, f"{kind}_{rows}_{seed}.csv")
+    truth_path = os.path.join(work_dir, f"{kind}_{rows}_{seed}_truth.csv")
+    output_path = os.path.join(work_dir, f"{kind}_{rows}_{seed}_processed.csv")
+    stats_path = os.path.join(work_dir, f"{kind}_{rows}_{seed}_stats.json")
+    print(f"Generating {rows} {kind} rows...", file=sys.stderr)
+    entities = generate(kind, rows, input_path, truth_path, duplicate_rate, typo_rate, seed=seed)
+    print(f"Running {os.path.basename(SCRIPTS[kind])} {' '.join(script_args)}...", file=sys.stderr)
+    # Each run gets its own process so peak memory belongs to that run alone; the script reports its own counters with --stats
+    start = time.perf_counter()
+    subprocess.run([sys.executable, SCRIPTS[kind], input_path, '-o', output_path, '--stats', stats_path, *script_args], check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    wall_seconds = time.perf_counter() - start
+    with open(stats_path, encoding='utf-8') as stats_file:
+        stats = json.load(stats_file)
+    counters = stats['counters']
+    result = {
+        'kind': kind,
+        'script': os.path.basename(SCRIPTS[kind]),
+        'script_args': script_args,
+        'rows': rows,
+        'entities': entities,
+        'duplicate_rate': duplicate_rate,
+        'typo_rate': typo_rate,
+        'seed': seed,
+        'wall_seconds': round(wall_seconds, 3),
+        # Only the top-level stages have CPU times; --workers processes report theirs as a counter
+        'cpu_seconds': round(sum(stage['cpu_seconds'] for stage in stats['stages'].values() if stage['cpu_seconds'] is not None) + counters.get('worker_cpu_ms', 0) / 1000, 3),
+        'rows_per_second': round(rows / wall_seconds, 1),
+        'peak_rss_mb': stats['peak_memory_mb'],
+        'candidate_pairs': counters.get('candidate_pairs', 0),
+        'fuzzy_comparisons': counters.get('fuzzy_calls', 0),
+        'exact_key_matches': counters.get('exact_key_matches', 0),
+        'stages': {name: stage['wall_seconds'] for name, stage in stats['stages'].items()},
+    }
+    result.update(score_clusters(output_path, truth_path))
+    return result
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks the duplicate-detection scripts on generated data and reports the results as JSON.",
+                                     epilog="Arguments after -- are passed to the scripts, e.g. -- --workers 4 --stream")
+    parser.add_argument("--kinds", nargs='+', choices=sorted(SCRIPTS), default=sorted(SCRIPTS), help="Scripts to benchmark. (Default: both)")
+    parser.add_argument("--sizes", nargs='+', type=parse_size, default=[parse_size(size) for size in DEFAULT_SIZES], help="Row counts, or 10k, 100k, 1m. (Default: 10k)")
+    parser.add_argument("--duplicate-rate", type=float, default=DEFAULT_DUPLICATE_RATE, help=f"Share of generated rows that copy an earlier entity. (Default: {DEFAULT_DUPLICATE_RATE})")
+    parser.add_argument("--typo-rate", type=float, default=DEFAULT_TYPO_RATE, help=f"Chance of a typo in each copied text field. (Default: {DEFAULT_TYPO_RATE})")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the generated data. (Default: 0)")
+    parser.add_argument("--work-dir", help="Directory for the generated and processed files. (Default: a temporary directory that is removed afterwards)")
+    parser.add_argument("-o", "--output_file", help="Write the JSON results to this file instead of standard output.")
+    args, script_args = parser.parse_known_args()
+    script_args = [arg for arg in script_args if arg != '--']
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        work_dir = args.work_dir or temp_dir
+        os.makedirs(work_dir, exist_ok=True)
+        runs = [run_benchmark(kind, rows, work_dir, args.duplicate_rate, args.typo_rate, args.seed, script_args) for rows in args.sizes for kind in args.kinds]
+    results = {
+        'generated_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'git_commit': get_git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'runs': runs,
+    }
+    if args.output_file:
+        with open(args.output_file, 'w', encoding='utf-8') as outfile:
+            json.dump(results, outfile, indent=2)
+        print(f"Benchmark results saved to {args.output_file}", file=sys.stderr)
+    else:
+        print(json.dumps(results, indent=2))
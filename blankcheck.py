@@ -0,0 +1,2230 @@
+import csv
+import sys
+import time
+import hashlib
+import json
+import re
+import os
+import math
+import heapq
+import tempfile
+import sqlite3
+import pickle
+import signal
+import zlib
+import pstats
+import cProfile
+import argparse
+from array import array
+from collections import defaultdict, namedtuple
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, as_completed, wait
+from contextlib import contextmanager, nullcontext
+from functools import lru_cache, partial
+from itertools import islice
+from operator import itemgetter
+
+try:
+    import resource  # Used for the peak memory in --stats; not available on Windows
+except ImportError:
+    resource = None
+
+# --- Installation of Required Libraries ---
+# This module requires the following libraries. Install them by running this command:
+# pip install rapidfuzz Metaphone tqdm numpy
+# A missing library raises ImportError with the install command, so a pipeline importing this module can handle
+# it; the profile scripts print the message and exit.
+
+def missing_library_error(library, purpose, package):
+    return ImportError(f"The '{library}' library is not installed. This is required for {purpose}.\nPlease install it by running: pip install {package}")
+
+try:
+    from rapidfuzz import process, fuzz
+except ImportError as error:
+    raise missing_library_error('rapidfuzz', 'fuzzy matching', 'rapidfuzz') from error
+
+try:
+    from metaphone import doublemetaphone
+except ImportError as error:
+    raise missing_library_error('Metaphone', 'phonetic blocking', 'Metaphone') from error
+
+try:
+    import numpy as np
+except ImportError as error:
+    raise missing_library_error('numpy', 'batched duplicate scoring', 'numpy') from error
+
+try:
+    from tqdm import tqdm
+except ImportError as error:
+    raise missing_library_error('tqdm', 'the progress bar', 'tqdm') from error
+
+try:
+    import pyarrow as pa  # Optional: only needed for Parquet and Arrow input and output
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pc = pq = None
+
+
+# --- Configuration ---
+# Grade weights used when a profile does not set its own
+DEFAULT_GRADE_WEIGHTS = {'a': 3, 'b': 2, 'c': 1}
+# Slack kept when pruning so float rounding in the partial sums can never drop a candidate that reaches the threshold.
+PRUNING_TOLERANCE = 1e-6
+# Candidate batches at least this large are scored by rapidfuzz on all cores (workers=-1);
+# smaller batches stay single-threaded because thread start-up costs more than it saves.
+PARALLEL_SCORING_MIN_CANDIDATES = 1000
+# Approximate number of record comparisons sent to a worker process in one task when running with --workers.
+PARALLEL_CHUNK_COMPARISONS = 200000
+# Length of the secondary key used to split blocks larger than a profile's MAX_BLOCK_SIZE (see Deduplicator.get_sub_block_key).
+SUB_BLOCK_KEY_LENGTH = 4
+# Number of largest blocks listed in the --block-stats file
+BLOCK_STATS_TOP_N = 20
+# Rows listed in a record's is_matched_to column; any further matches are only counted
+MAX_MATCHED_BY_LISTED = 50
+# Number of functions printed, by cumulative time, after a --profile run.
+PROFILE_TOP_N = 25
+
+# MinHash LSH blocking ('minhash' in BLOCKING_FIELDS): values are split into character shingles of this size and
+# get MINHASH_BANDS block keys of MINHASH_ROWS MinHash values each, unless a profile sets its own bands and rows.
+MINHASH_SHINGLE_SIZE = 3
+MINHASH_BANDS = 8
+MINHASH_ROWS = 3
+MINHASH_PRIME = (1 << 61) - 1
+MINHASH_SEED = 20240601
+# With --checkpoint, Pass 1 state is saved at most this often; Pass 2 records its progress after every batch
+CHECKPOINT_INTERVAL_SECONDS = 600
+# --memory-budget: normalized records are spilled to between MIN_SPILL_PARTITIONS and MAX_SPILL_PARTITIONS files per
+# stage, SPILL_BATCH_ENTRIES entries at a time, and partitions are grouped into shards whose spill size times
+# SPILL_MEMORY_FACTOR fits the budget. The factor is the peak memory of loading and scoring a shard relative to its
+# spill files, measured at 2.7-3.3x for the Contact profile and 4.6-4.9x for the Account/Lead profile's larger blocks.
+# The budget covers one shard only: the interpreter and libraries, the normalization caches, the row Ids and match
+# maps of the whole input, clustering and Pass 2 come on top of it.
+MIN_SPILL_PARTITIONS = 16
+MAX_SPILL_PARTITIONS = 256
+SPILL_BATCH_ENTRIES = 256
+SPILL_MEMORY_FACTOR = 5
+# Files with these extensions are read and written with pyarrow; anything else is CSV
+ARROW_FILE_FORMATS = {'.parquet': 'parquet', '.arrow': 'arrow', '.feather': 'arrow'}
+# Rows per record batch when reading Parquet/Arrow input and when writing results
+RESULT_BATCH_ROWS = 65536
+# Arrow types of the result columns in Parquet/Arrow output; the per-field score columns are int16
+ARROW_RESULT_TYPES = {
+    'total_row_score': 'int32',
+    'final_status': 'string',
+    'duplicate_score': 'int16',
+    'duplicate_match_details': 'string',
+    'is_matched_to': 'string',
+    'is_duplicate_or_matched': 'bool_',
+    'match_key': 'int64',
+    'cluster_size': 'int32',
+    'is_cluster_survivor': 'bool_',
+    'failed_fields': 'string',
+    'duplicate_of_id': 'string',
+    'reference_match_score': 'int16',
+    'reference_match_id': 'string',
+    'reference_match_details': 'string',
+    'reference_match_count': 'int32',
+}
+
+# --- Persistent Dedupe Index (--index) ---
+INDEX_FORMAT_VERSION = 4
+INDEX_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS records (seq INTEGER PRIMARY KEY, record_key TEXT UNIQUE, unique_id TEXT, row_hash TEXT, data TEXT, best_seq INTEGER, best_score REAL, best_scores TEXT);
+CREATE TABLE IF NOT EXISTS postings (block_key TEXT, seq INTEGER);
+CREATE INDEX IF NOT EXISTS postings_seq ON postings (seq);
+CREATE TABLE IF NOT EXISTS pairs (seq_a INTEGER, seq_b INTEGER, PRIMARY KEY (seq_a, seq_b));
+CREATE INDEX IF NOT EXISTS pairs_seq_b ON pairs (seq_b);
+"""
+
+# --- Normalization ---
+# Patterns are compiled once; company suffix variants are canonicalized by one alternation regex whose
+# capture groups index SUFFIX_CANONICAL_FORMS.
+NORMALIZATION_CACHE_SIZE = 65536
+SUFFIX_VARIANTS = {
+    'limited': ['limited', 'ltd'],
+    'incorporated': ['incorporated', 'inc'],
+    'company': ['company', 'co'],
+    'solutions': ['solutions', 'solns'],
+    'group': ['group', 'grp'],
+}
+SUFFIX_CANONICAL_FORMS = list(SUFFIX_VARIANTS)
+SUFFIX_PATTERN = re.compile(r'\b(?:' + '|'.join(f"({'|'.join(variants)})" for variants in SUFFIX_VARIANTS.values()) + r')\b', re.IGNORECASE)
+PUNCTUATION_PATTERN = re.compile(r'[.,\/#!$%\^&\*;:{}=\-_`~()]')
+WHITESPACE_PATTERN = re.compile(r'\s+')
+NON_DIGIT_PATTERN = re.compile(r'\D')
+URL_SCHEME_PATTERN = re.compile(r'https?://', re.IGNORECASE)
+WWW_PATTERN = re.compile(r'www.', re.IGNORECASE)
+URL_PATH_PATTERN = re.compile(r'[/?#]')
+REPEATED_DOTS_PATTERN = re.compile(r'\.+')
+
+
+# --- Field Scoring ---
+# Pass 2 compiles the header once into a ColumnPlan per column and applies the plans to every row.
+ALPHANUMERIC_PATTERN = re.compile(r'[a-zA-Z0-9]')
+DOMAIN_PATTERN = re.compile(r'\.[a-zA-Z]{2,}')
+UK_POSTCODE_PATTERN = re.compile(r'([Gg][Ii][Rr] 0[Aa]{2})|((([A-Za-z][0-9]{1,2})|(([A-Za-z][A-Ha-hJ-Yj-y][0-9]{1,2})|(([A-Za-z][0-9][A-Za-z])|([A-Za-z][A-Ha-hJ-Yj-y][0-9][A-Za-z]?))))\s?[0-9][A-Za-z]{2})')
+ColumnPlan = namedtuple('ColumnPlan', ['col_name', 'grade', 'weight', 'checks'])
+
+def check_phone(value):
+    if sum(c.isdigit() for c in value) < 5:
+        return "Phone number has fewer than 5 digits."
+
+def check_website(value):
+    if not DOMAIN_PATTERN.search(value):
+        return "Website does not look like a valid domain."
+
+def check_postalcode(value):
+    if not UK_POSTCODE_PATTERN.fullmatch(value.strip()):
+        return "Does not match UK postcode format."
+
+# Special checks, applied in this order to the fields whose name contains the keyword
+FIELD_CHECKS = [('phone', check_phone), ('website', check_website), ('postalcode', check_postalcode)]
+
+def get_field_checks(field_name):
+    field_name_lower = field_name.lower()
+    return tuple(check for keyword, check in FIELD_CHECKS if keyword in field_name_lower)
+
+def get_field_failure(value, checks):
+    """
+    Returns the reason a field value fails its checks, or None if it passes.
+    """
+    if value is None or not value.strip():
+        return "Value is empty."
+    if not ALPHANUMERIC_PATTERN.search(value):
+        return "Value contains only symbols."
+    for check in checks:
+        failure = check(value)
+        if failure:
+            return failure
+    return None
+
+def get_field_score(field_name, value, debug=False):
+    """
+    Scores a single field. It applies basic checks to all fields,
+    and special checks for fields containing certain keywords.
+    """
+    failure = get_field_failure(value, get_field_checks(field_name))
+    if failure:
+        if debug: print(f"         - Field '{field_name}' failed: {failure}")
+        return 0
+    return 1
+
+def score_row(row_dict, scoring_plan, debug=False):
+    """
+    Scores every field of a row with a compiled scoring plan. Returns (scores_list, total_row_score, any_a_field_failed).
+    """
+    total_row_score, any_a_field_failed, scores_list = 0, False, []
+    for col_name, grade, weight, checks in scoring_plan:
+        value = row_dict.get(col_name, "")
+        failure = get_field_failure(value, checks)
+        if failure:
+            if debug: print(f"         - Field '{col_name}' failed: {failure}")
+            if grade == 'a': any_a_field_failed = True
+            scores_list.append(0)
+        else:
+            scores_list.append(weight)
+            total_row_score += weight
+    return scores_list, total_row_score, any_a_field_failed
+
+def create_visualizations(processed_file_path):
+    pass
+
+def canonical_suffix(match):
+    return SUFFIX_CANONICAL_FORMS[match.lastindex - 1]
+
+def normalize_phone(value):
+    return NON_DIGIT_PATTERN.sub('', value)
+
+@lru_cache(maxsize=NORMALIZATION_CACHE_SIZE)
+def normalize_website(value):
+    value = URL_SCHEME_PATTERN.sub('', value)
+    value = WWW_PATTERN.sub('', value)
+    return value.rstrip('/')
+
+def website_host(value):
+    # The exact-match key of a normalized website is its host, so 'acme.com/home' joins 'acme.com'
+    return URL_PATH_PATTERN.split(value, 1)[0]
+
+@lru_cache(maxsize=NORMALIZATION_CACHE_SIZE)
+def normalize_name(value):
+    # Remove punctuation, collapse whitespace and canonicalize common company suffixes
+    value = PUNCTUATION_PATTERN.sub('', value)
+    value = WHITESPACE_PATTERN.sub(' ', value)
+    value = SUFFIX_PATTERN.sub(canonical_suffix, value)
+    return value.strip()
+
+@lru_cache(maxsize=NORMALIZATION_CACHE_SIZE)
+def normalize_email_domain(domain):
+    return REPEATED_DOTS_PATTERN.sub('.', domain)
+
+def normalize_email(value):
+    # Remove dots before @ and ignore case, ignore common typos like double letters
+    local, _, domain = value.partition('@')
+    return f"{local.replace('.', '')}@{normalize_email_domain(domain)}"
+
+FIELD_NORMALIZERS = {
+    'phone': normalize_phone,
+    'website': normalize_website,
+    'email': normalize_email,
+    'company_name__c': normalize_name,
+    'name': normalize_name,
+}
+# Applied to a normalized value when the field is one of EXACT_MATCH_KEYS; fuzzy scoring still sees the full value
+EXACT_KEY_REDUCERS = {
+    'website': website_host,
+}
+
+def normalize_value(key, value):
+    """
+    Helper function to normalize values for comparison using robust cleaning techniques.
+    """
+    if not value or not isinstance(value, str) or not value.strip():
+        return ""
+    value = value.lower().strip()
+    normalizer = FIELD_NORMALIZERS.get(key)
+    return normalizer(value) if normalizer else value
+
+def normalize_record(row_dict, header_map):
+    """Returns {match field: normalized value} for a CSV row, where header_map maps each match field to its column."""
+    return {key: normalize_value(key, row_dict.get(col_name)) for key, col_name in header_map.items()}
+
+class RecordStore:
+    """
+    Columnar store for the normalized records of Pass 1. Each record is held once, as one entry in a
+    list per match field plus its unique id, and is addressed by its row index, so the blocking index
+    only needs to hold integer row indexes.
+    """
+    __slots__ = ('columns', 'unique_ids')
+
+    def __init__(self, fields):
+        self.columns = {key: [] for key in fields}
+        self.unique_ids = []
+
+    def __len__(self):
+        return len(self.unique_ids)
+
+    def append(self, record_normalized, unique_id):
+        for key, column in self.columns.items():
+            column.append(record_normalized[key])
+        self.unique_ids.append(unique_id)
+
+    def record(self, row_index):
+        """Returns {field: value} for one record."""
+        return {key: column[row_index] for key, column in self.columns.items()}
+
+    def completeness(self, row_index):
+        """Returns the number of non-empty match fields of a record."""
+        return sum(1 for column in self.columns.values() if column[row_index])
+
+    def gather(self, row_indexes):
+        """Returns {field: values} for the given row indexes, in the order given."""
+        if len(row_indexes) == 1:
+            row_index = row_indexes[0]
+            return {key: (column[row_index],) for key, column in self.columns.items()}
+        getter = itemgetter(*row_indexes)
+        return {key: getter(column) for key, column in self.columns.items()}
+
+class BlockingIndex:
+    """
+    Maps each block key to the row indexes in that block, in row order. With max_block_size set, a block
+    that reaches the cap stops growing and later rows go to sub-blocks keyed by Deduplicator.get_sub_block_key. Such a
+    row is compared with the first max_block_size rows of the block plus the max_block_size most recent
+    rows of its sub-block, so the comparisons per row stay bounded however common the block key is.
+    """
+    __slots__ = ('blocks', 'sub_blocks', 'max_block_size')
+
+    def __init__(self, max_block_size=None):
+        self.blocks = defaultdict(partial(array, 'I'))
+        self.sub_blocks = defaultdict(dict)  # Maps block key to {sub-block key: row indexes}
+        self.max_block_size = max_block_size
+
+    def is_full(self, block_key):
+        return bool(self.max_block_size) and len(self.blocks.get(block_key, ())) >= self.max_block_size
+
+    def candidates(self, block_key, sub_block_key=None):
+        """Returns the row indexes a new row with these keys is compared with, in row order."""
+        block = self.blocks.get(block_key)
+        if block is None:
+            return ()
+        sub_block = self.sub_blocks[block_key].get(sub_block_key) if self.is_full(block_key) else None
+        return block + sub_block[-self.max_block_size:] if sub_block else block
+
+    def add(self, block_key, sub_block_key, row_index):
+        if self.is_full(block_key):
+            sub_blocks = self.sub_blocks[block_key]
+            if sub_block_key not in sub_blocks:
+                sub_blocks[sub_block_key] = array('I')
+            sub_blocks[sub_block_key].append(row_index)
+        else:
+            self.blocks[block_key].append(row_index)
+
+    def work_units(self):
+        """
+        Yields (row_indexes, start, base_size, window) covering every comparison the serial pass makes: the
+        row at position p >= start is compared with positions [0, base_size) and [max(base_size, p - window), p).
+        A plain block is (block, 1, 0, None); a sub-block is appended to its full parent block.
+        """
+        for block_key, block in self.blocks.items():
+            yield block, 1, 0, None
+            for sub_block in self.sub_blocks.get(block_key, {}).values():
+                yield block + sub_block, len(block), len(block), self.max_block_size
+
+    def block_sizes(self):
+        """Returns {block key: rows compared within it}; a sub-block is reported as 'block key|sub-block key'."""
+        sizes = {block_key: len(block) for block_key, block in self.blocks.items()}
+        for block_key, sub_blocks in self.sub_blocks.items():
+            for sub_block_key, sub_block in sub_blocks.items():
+                sizes[f"{block_key}|{sub_block_key}"] = len(sub_block)
+        return sizes
+
+def block_size_histogram(block_sizes):
+    """Buckets block sizes by powers of two: {'1': count, '2-3': count, '4-7': count, ...}."""
+    histogram = {}
+    for size in sorted(block_sizes):
+        low = 1 << (size.bit_length() - 1)
+        bucket = str(low) if low == 1 else f"{low}-{2 * low - 1}"
+        histogram[bucket] = histogram.get(bucket, 0) + 1
+    return histogram
+
+class BlockSizeTally:
+    """
+    The block sizes of one or more blocking indexes: every non-empty block's size and the BLOCK_STATS_TOP_N
+    largest blocks with their keys. A sharded Pass 1 (--memory-budget) adds each shard's index in turn, so the
+    report covers every block without keeping them all.
+    """
+    __slots__ = ('sizes', 'largest', 'split_blocks', 'max_block_size', 'added')
+
+    def __init__(self, max_block_size=None):
+        self.sizes = array('I')
+        self.largest = []  # Min-heap of (size, -order added, block key)
+        self.split_blocks = 0
+        self.max_block_size = max_block_size
+        self.added = 0
+
+    def add(self, seen_records_blocked):
+        for block_key, size in seen_records_blocked.block_sizes().items():
+            if not size:
+                continue
+            self.sizes.append(size)
+            entry = (size, -self.added, block_key)
+            self.added += 1
+            if len(self.largest) < BLOCK_STATS_TOP_N:
+                heapq.heappush(self.largest, entry)
+            elif entry > self.largest[0]:
+                heapq.heapreplace(self.largest, entry)
+        self.split_blocks += len(seen_records_blocked.sub_blocks)
+        return self
+
+    def largest_blocks(self):
+        """Returns [(block key, size)] of the largest blocks, largest first and earliest added on a tie."""
+        return [(block_key, size) for size, _, block_key in sorted(self.largest, reverse=True)]
+
+def report_block_sizes(seen_records_blocked, block_stats_path=None, show=True):
+    """
+    Prints a histogram of the block sizes of a BlockingIndex or BlockSizeTally, unless show is False, and, when
+    block_stats_path is given, writes it together with the largest blocks to that file as JSON.
+    """
+    if not isinstance(seen_records_blocked, BlockSizeTally):
+        seen_records_blocked = BlockSizeTally(seen_records_blocked.max_block_size).add(seen_records_blocked)
+    sizes = seen_records_blocked.sizes
+    if not sizes:
+        return
+    histogram = block_size_histogram(sizes)
+    largest = seen_records_blocked.largest_blocks()
+    if show:
+        print(f"\nBlocking index: {len(sizes)} blocks, largest has {largest[0][1]} rows ({largest[0][0]})")
+        for bucket, count in histogram.items():
+            print(f"    {bucket:>11} rows: {count} blocks")
+    if block_stats_path:
+        stats = {
+            'blocks': len(sizes),
+            'max_block_size': seen_records_blocked.max_block_size,
+            'split_blocks': seen_records_blocked.split_blocks,
+            'histogram': histogram,
+            'largest_blocks': [{'key': key, 'size': size} for key, size in largest],
+        }
+        with open(block_stats_path, mode='w', encoding='utf-8') as stats_file:
+            json.dump(stats, stats_file, indent=2)
+
+class DisjointSet:
+    """
+    Union-find over row indexes with path compression, used to group every pair of rows scoring at or above
+    the similarity threshold into match clusters. Only rows that take part in a match are stored, and each set
+    is rooted at its earliest row.
+    """
+    __slots__ = ('parent',)
+
+    def __init__(self):
+        self.parent = {}
+
+    def find(self, row_index):
+        parent = self.parent
+        root = row_index
+        while parent.get(root, root) != root:
+            root = parent[root]
+        while row_index != root:
+            parent[row_index], row_index = root, parent[row_index]
+        return root
+
+    def union(self, row_a, row_b):
+        root_a, root_b = self.find(row_a), self.find(row_b)
+        if root_a == root_b:
+            return
+        if root_a > root_b:
+            root_a, root_b = root_b, root_a
+        self.parent[root_b] = root_a
+        self.parent.setdefault(root_a, root_a)
+
+    def clusters(self):
+        """Returns {root row index: member row indexes in row order}."""
+        members = defaultdict(list)
+        for row_index in sorted(self.parent):
+            members[self.find(row_index)].append(row_index)
+        return members
+
+def assign_clusters(match_clusters, completeness):
+    """
+    Numbers the match clusters 1, 2, ... in order of their earliest row and picks a survivor for each:
+    the member with the most non-empty match fields, the earliest row on a tie.
+    Returns {row_index: (cluster_id, cluster_size, survivor_row_index)}.
+    """
+    cluster_of = {}
+    clusters = match_clusters.clusters()
+    for cluster_id, root in enumerate(sorted(clusters), start=1):
+        members = clusters[root]
+        survivor = max(members, key=lambda row_index: (completeness(row_index), -row_index))
+        for row_index in members:
+            cluster_of[row_index] = (cluster_id, len(members), survivor)
+    return cluster_of
+
+def coerce_record(record):
+    """
+    Returns a record with every value a string, as in a row read from a CSV: None becomes an empty string and
+    any other value (an int, float or bool from an API) its str(). A record of strings is returned as it is.
+    """
+    if all(isinstance(value, str) for value in record.values()):
+        return record
+    return {key: value if isinstance(value, str) else "" if value is None else str(value) for key, value in record.items()}
+
+def get_row_hash(row_dict, header):
+    return hashlib.blake2b('\x1f'.join(row_dict.get(h) or '' for h in header).encode('utf-8'), digest_size=16).hexdigest()
+
+# --- Run Statistics (--stats) ---
+
+class RunStats:
+    """
+    Collects the --stats report: wall and CPU time per stage, wall time per sub-stage, counters and peak memory.
+    Sub-stages inside the row loops are timed by wrapping the functions those loops call with timed(), which is
+    only done when --stats is given, so a run without it pays nothing more than an `if stats` check.
+    """
+    __slots__ = ('stages', 'counters')
+
+    def __init__(self):
+        self.stages = {}  # Maps stage name to [wall seconds, CPU seconds or None]
+        self.counters = defaultdict(int)
+
+    def _totals(self, name, cpu=False):
+        if name not in self.stages:
+            self.stages[name] = [0.0, 0.0 if cpu else None]
+        return self.stages[name]
+
+    @contextmanager
+    def stage(self, name):
+        totals = self._totals(name, cpu=True)
+        start_wall, start_cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            totals[0] += time.perf_counter() - start_wall
+            totals[1] += time.process_time() - start_cpu
+
+    def timed(self, name, function):
+        """Returns function wrapped to add its wall time to the sub-stage `name`."""
+        totals = self._totals(name)
+        def timed_function(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                totals[0] += time.perf_counter() - start
+        return timed_function
+
+    def timed_rows(self, name, rows):
+        """Yields from rows, adding the time spent reading each row to the sub-stage `name`."""
+        totals = self._totals(name)
+        iterator = iter(rows)
+        while True:
+            start = time.perf_counter()
+            row = next(iterator, None)
+            totals[0] += time.perf_counter() - start
+            if row is None:
+                return
+            yield row
+
+    def add(self, name, value=1):
+        self.counters[name] += value
+
+    def update(self, counters):
+        for name, value in counters.items():
+            self.counters[name] += value
+
+    def count_blocks(self, seen_records_blocked):
+        if isinstance(seen_records_blocked, BlockSizeTally):
+            sizes = seen_records_blocked.sizes
+        else:
+            sizes = [size for size in seen_records_blocked.block_sizes().values() if size]
+        self.counters['blocks'] = len(sizes)
+        self.counters['max_block_size'] = max(sizes, default=0)
+        self.counters['mean_block_size'] = round(sum(sizes) / len(sizes), 2) if sizes else 0
+
+    def write(self, stats_path):
+        # ru_maxrss is in kilobytes on Linux and bytes on macOS; the resource module does not exist on Windows
+        peak_memory_mb = None
+        if resource is not None:
+            peak_rss = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+            peak_memory_mb = round(peak_rss / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+        report = {
+            'stages': {name: {'wall_seconds': round(wall, 4), 'cpu_seconds': round(cpu, 4) if cpu is not None else None} for name, (wall, cpu) in self.stages.items()},
+            'counters': dict(self.counters),
+            'peak_memory_mb': peak_memory_mb,
+        }
+        with open(stats_path, mode='w', encoding='utf-8') as stats_file:
+            json.dump(report, stats_file, indent=2)
+
+def get_stage(stats):
+    """Returns stats.stage, or a stage() that does nothing when the run has no --stats."""
+    return stats.stage if stats else (lambda name: nullcontext())
+
+def get_timer(stats):
+    """Returns stats.timed, or a timed() that returns the function unwrapped when the run has no --stats."""
+    return stats.timed if stats else (lambda name, function: function)
+
+class OffsetLineReader:
+    """
+    Feeds the lines of a CSV file opened in binary mode to the csv module while keeping track of the
+    byte offset reached, so the start of every row can be recorded and sought back to later.
+    """
+    def __init__(self, raw_file):
+        self.raw_file = raw_file
+        self.offset = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        line = self.raw_file.readline()
+        if not line:
+            raise StopIteration
+        # Decode like the 'utf-8-sig' text reader: drop a byte order mark at the very start of the file
+        text = line.decode('utf-8-sig' if self.offset == 0 else 'utf-8')
+        self.offset += len(line)
+        return text
+
+def iter_csv_rows(input_file_path, row_offsets=None, start_offset=None):
+    """
+    Streams the data rows of a CSV file as dicts, one at a time, instead of loading the whole file.
+    When row_offsets is given, the byte offset at which each row starts is appended to it. With start_offset
+    (a recorded row offset) the rows before it are skipped without being read.
+    """
+    with open(input_file_path, mode='rb') as raw_file:
+        line_reader = OffsetLineReader(raw_file)
+        reader = csv.DictReader(line_reader)
+        reader.fieldnames  # Consume the header so the first offset taken is that of the first data row
+        if start_offset is not None:
+            raw_file.seek(start_offset)
+            line_reader.offset = start_offset
+        while True:
+            offset = line_reader.offset
+            row_dict = next(reader, None)
+            if row_dict is None:
+                return
+            if row_offsets is not None:
+                row_offsets.append(offset)
+            yield row_dict
+
+# --- Checkpoints (--checkpoint / --resume) ---
+
+class Checkpoint:
+    """
+    Keeps the state of a run in a file so --resume can continue it after a crash or eviction. During Pass 1 the
+    row cursor, normalized records, blocking index and match maps are pickled at most every
+    CHECKPOINT_INTERVAL_SECONDS (and when the run is interrupted); once clustering is done they are replaced by
+    the match results. Pass 2 records the rows it has flushed to the output, and the output's length, in a small
+    sidecar file after every batch. A checkpoint only resumes the run it was written for: the same input file,
+    output file, match settings and mode.
+    """
+
+    def __init__(self, checkpoint_path, run_key):
+        self.checkpoint_path = checkpoint_path
+        self.progress_path = f"{checkpoint_path}.pass2"
+        self.run_key = run_key
+        self.last_save = time.monotonic()
+        self.row_offsets = None  # Byte offsets of the rows read so far in --stream mode
+        self.pass1_state = None
+        self.match_result = None
+        self.pass2_progress = None
+        self.stop_signal = None
+
+    def load(self):
+        """Loads the checkpoint of an interrupted run; returns False when there is none for this run."""
+        try:
+            with open(self.checkpoint_path, 'rb') as checkpoint_file:
+                saved = pickle.load(checkpoint_file)
+        except FileNotFoundError:
+            print(f"No checkpoint found at {self.checkpoint_path}; starting from the beginning.")
+            return False
+        if saved['run_key'] != self.run_key:
+            print("The checkpoint was written for a different input, output or settings; starting from the beginning.")
+            return False
+        self.row_offsets = saved['row_offsets']
+        self.pass1_state = saved.get('pass1_state')
+        self.match_result = saved.get('match_result')
+        if self.match_result is not None and os.path.exists(self.progress_path):
+            with open(self.progress_path, encoding='utf-8') as progress_file:
+                self.pass2_progress = json.load(progress_file)
+        return True
+
+    def due(self):
+        return time.monotonic() - self.last_save >= CHECKPOINT_INTERVAL_SECONDS
+
+    @contextmanager
+    def deferred_stop(self):
+        """
+        Defers Ctrl+C and SIGTERM (e.g. a pod eviction) while Pass 1 runs: they only set stop_signal, and the
+        loop saves a checkpoint and stops at the end of the current row.
+        """
+        def request_stop(signum, frame):
+            self.stop_signal = signum
+        previous_handlers = {}
+        try:
+            for signum in (signal.SIGINT, signal.SIGTERM):
+                previous_handlers[signum] = signal.signal(signum, request_stop)
+        except ValueError:
+            pass  # Signal handlers can only be set in the main thread; run without deferring there
+        try:
+            yield
+        finally:
+            for signum, handler in previous_handlers.items():
+                signal.signal(signum, handler)
+
+    def stop_if_requested(self):
+        if self.stop_signal is not None:
+            raise SystemExit(f"Stopped by signal {self.stop_signal}. The checkpoint is saved at {self.checkpoint_path}; run again with --resume to continue.")
+
+    def _replace(self, path, write):
+        # Written to a temporary file first so a crash while saving leaves the previous checkpoint intact.
+        # write(temp_file) streams the data, so the state is never held a second time as bytes.
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'wb') as temp_file:
+            write(temp_file)
+            temp_file.flush()
+            os.fsync(temp_file.fileno())
+        os.replace(temp_path, path)
+
+    def save(self, **state):
+        """Saves either pass1_state or match_result, with the row offsets read so far."""
+        state = {'run_key': self.run_key, 'row_offsets': self.row_offsets, **state}
+        self._replace(self.checkpoint_path, partial(pickle.dump, state, protocol=pickle.HIGHEST_PROTOCOL))
+        if 'match_result' in state and os.path.exists(self.progress_path):
+            os.remove(self.progress_path)
+        self.last_save = time.monotonic()
+
+    def save_pass2(self, rows_written, output_offset):
+        progress = json.dumps({'rows_written': rows_written, 'output_offset': output_offset}).encode('utf-8')
+        self._replace(self.progress_path, lambda temp_file: temp_file.write(progress))
+
+    def remove(self):
+        for path in (self.checkpoint_path, self.progress_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+# --- Spill Files (--memory-budget) ---
+
+class SpillFiles:
+    """
+    A set of append-only partition files on local disk for the sharded Pass 1. Entries are buffered per
+    partition and pickled SPILL_BATCH_ENTRIES at a time, so each file holds its entries in the order added.
+    A file is only open while a batch is appended to it, so the number of partitions is not limited by the
+    number of files a process may have open.
+    """
+
+    def __init__(self, path_prefix, partition_count):
+        self.paths = [f"{path_prefix}-{partition:04d}.spill" for partition in range(partition_count)]
+        for path in self.paths:
+            open(path, mode='wb').close()
+        self.buffers = [[] for _ in range(partition_count)]
+
+    def _append(self, partition, buffer):
+        with open(self.paths[partition], mode='ab') as spill_file:
+            pickle.dump(buffer, spill_file, protocol=pickle.HIGHEST_PROTOCOL)
+
+    def partition_of(self, key):
+        # crc32 rather than hash(), which is salted per process
+        return zlib.crc32(key.encode('utf-8')) % len(self.paths)
+
+    def add(self, partition, entry):
+        buffer = self.buffers[partition]
+        buffer.append(entry)
+        if len(buffer) >= SPILL_BATCH_ENTRIES:
+            self._append(partition, buffer)
+            self.buffers[partition] = []
+
+    def close(self):
+        for partition, buffer in enumerate(self.buffers):
+            if buffer:
+                self._append(partition, buffer)
+        self.buffers = None
+
+    def total_size(self):
+        return sum(os.path.getsize(path) for path in self.paths)
+
+    def shards(self, memory_budget_bytes):
+        """
+        Groups consecutive partitions into shards whose spill size times SPILL_MEMORY_FACTOR fits the budget.
+        A partition larger than the budget on its own is a shard by itself. Returns a list of partition lists.
+        """
+        shards, current, current_size = [], [], 0
+        for partition, path in enumerate(self.paths):
+            size = os.path.getsize(path) * SPILL_MEMORY_FACTOR
+            if current and current_size + size > memory_budget_bytes:
+                shards.append(current)
+                current, current_size = [], 0
+            current.append(partition)
+            current_size += size
+        if current:
+            shards.append(current)
+        return shards
+
+    def read(self, partition):
+        """Yields the entries of one partition in the order they were added."""
+        with open(self.paths[partition], mode='rb') as spill_file:
+            while True:
+                try:
+                    batch = pickle.load(spill_file)
+                except EOFError:
+                    return
+                yield from batch
+
+    def read_merged(self, partitions):
+        """Yields the entries of several partitions merged into row order; entries start with their row index."""
+        return heapq.merge(*(self.read(partition) for partition in partitions), key=itemgetter(0))
+
+# --- Results ---
+# Columns added after the original values and the per-field scores in the output
+RESULT_COLUMNS = ['total_row_score', 'final_status', 'duplicate_score', 'duplicate_match_details', 'is_matched_to', 'is_duplicate_or_matched', 'match_key', 'cluster_size', 'is_cluster_survivor']
+# One result per input row: the row itself, its per-field scores in header order, the RESULT_COLUMNS values and
+# the Id of the row it is a duplicate of
+RowResult = namedtuple('RowResult', ['row', 'field_scores', *RESULT_COLUMNS, 'duplicate_of_id'])
+# Columns of a --results-only output, after the Id: the results without the original values or per-field scores.
+# failed_fields is a hex bitmask of the columns that failed their checks, bit j for the j-th input column.
+SIDECAR_COLUMNS = ['total_row_score', 'final_status', 'failed_fields', 'duplicate_score', 'duplicate_of_id', 'match_key', 'cluster_size', 'is_cluster_survivor']
+# Result columns of a --reference run: the best reference record for each query row
+REFERENCE_RESULT_COLUMNS = ['total_row_score', 'final_status', 'reference_match_score', 'reference_match_id', 'reference_match_details', 'reference_match_count']
+ReferenceResult = namedtuple('ReferenceResult', ['row', 'field_scores', *REFERENCE_RESULT_COLUMNS])
+# The normalized records, blocking index and first row of each exact-match key of a reference file
+ReferenceIndex = namedtuple('ReferenceIndex', ['record_store', 'blocks', 'exact_match_rows'])
+# What Pass 1 and clustering produce for Pass 2; all keyed by row index
+MatchResult = namedtuple('MatchResult', ['row_ids', 'duplicate_of', 'matched_by', 'matched_by_count', 'cluster_of'])
+
+# --- Parquet / Arrow Files ---
+
+def get_file_format(file_path):
+    """Returns 'parquet', 'arrow' (Arrow IPC / Feather v2) or 'csv', from the file extension."""
+    return ARROW_FILE_FORMATS.get(os.path.splitext(file_path)[1].lower(), 'csv')
+
+def pyarrow_missing(*file_paths):
+    """Prints an error and returns True when any of the file paths is a Parquet/Arrow file and pyarrow is not installed."""
+    if pa is None and any(path and get_file_format(path) != 'csv' for path in file_paths):
+        print(f"Error: {missing_library_error('pyarrow', 'Parquet and Arrow files', 'pyarrow')}")
+        return True
+    return False
+
+def read_arrow_schema(file_path):
+    if get_file_format(file_path) == 'parquet':
+        return pq.read_schema(file_path)
+    with pa.memory_map(file_path) as source:
+        return pa.ipc.open_file(source).schema
+
+def iter_arrow_batches(file_path, columns=None):
+    """
+    Yields the record batches of a Parquet or Arrow file, RESULT_BATCH_ROWS rows at a time, reading only the
+    given columns. Arrow files are memory-mapped, so the batches point into the file rather than copying it.
+    """
+    if get_file_format(file_path) == 'parquet':
+        yield from pq.ParquetFile(file_path).iter_batches(batch_size=RESULT_BATCH_ROWS, columns=columns)
+        return
+    with pa.memory_map(file_path) as source:
+        table = pa.ipc.open_file(source).read_all()
+        yield from (table.select(columns) if columns else table).to_batches(max_chunksize=RESULT_BATCH_ROWS)
+
+def arrow_column_strings(column):
+    """The values of an Arrow column as strings, converted in one cast; nulls become empty strings as in a CSV."""
+    if not (pa.types.is_string(column.type) or pa.types.is_large_string(column.type)):
+        column = pc.cast(column, pa.string())
+    return ["" if value is None else value for value in column.to_pylist()]
+
+def arrow_batch_rows(batch):
+    """Returns the rows of a record batch as dicts of strings, like the rows csv.DictReader gives."""
+    return [dict(zip(batch.schema.names, values)) for values in zip(*(arrow_column_strings(column) for column in batch.columns))]
+
+def iter_arrow_rows(file_path, columns=None):
+    for batch in iter_arrow_batches(file_path, columns):
+        yield from arrow_batch_rows(batch)
+
+def iter_chunks(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+def open_csv_output(output_file_path, header_row, resume_offset=None):
+    """Opens a CSV output and writes its header row; returns the file and its csv writer."""
+    if resume_offset is None:
+        outfile = open(output_file_path, mode='w', newline='', encoding='utf-8')
+        writer = csv.writer(outfile)
+        writer.writerow(header_row)
+    else:
+        # --resume: keep the rows flushed before the run stopped and append after them
+        outfile = open(output_file_path, mode='r+', newline='', encoding='utf-8')
+        outfile.seek(resume_offset)
+        outfile.truncate()
+        writer = csv.writer(outfile)
+    return outfile, writer
+
+def sync_csv_output(outfile):
+    """Makes the rows written so far durable and returns the length of the output, for --checkpoint."""
+    outfile.flush()
+    os.fsync(outfile.fileno())
+    return outfile.tell()
+
+def open_arrow_output(output_file_path, schema):
+    if get_file_format(output_file_path) == 'parquet':
+        return pq.ParquetWriter(output_file_path, schema)
+    return pa.ipc.new_file(output_file_path, schema)
+
+def arrow_result_array(values, result_type):
+    """An Arrow array of result column values; empty cells of numeric and boolean columns become nulls."""
+    if not pa.types.is_string(result_type):
+        values = [None if value == "" else value for value in values]
+    return pa.array(values, result_type)
+
+class CsvResultWriter:
+    """Writes Pass 2 results as CSV: the original values, the field scores and the result columns of each row."""
+
+    def __init__(self, output_file_path, header, result_columns=RESULT_COLUMNS, resume_offset=None):
+        self.header = header
+        self.result_end = 2 + len(result_columns)
+        self.outfile, self.writer = open_csv_output(output_file_path, header + [f"{h.strip()}_score" for h in header] + result_columns, resume_offset)
+
+    def write(self, results, source_batch=None):
+        self.writer.writerows([[result.row.get(h, "") for h in self.header] + result.field_scores + list(result[2:self.result_end]) for result in results])
+
+    def flush(self):
+        return sync_csv_output(self.outfile)
+
+    def close(self):
+        self.outfile.close()
+
+class ArrowResultWriter:
+    """
+    Writes Pass 2 results to a Parquet or Arrow file one record batch at a time. When the input is a Parquet
+    or Arrow file too, its columns are passed through as read, without converting a cell in Python. The field
+    scores and the numeric and boolean result columns are written as integer and boolean columns, with nulls
+    where the CSV output has empty cells.
+    """
+
+    def __init__(self, output_file_path, header, result_columns=RESULT_COLUMNS, source_schema=None):
+        self.header = header
+        self.passthrough = source_schema is not None
+        original_fields = list(source_schema) if self.passthrough else [pa.field(h, pa.string()) for h in header]
+        self.result_types = [getattr(pa, ARROW_RESULT_TYPES[name])() for name in result_columns]
+        self.schema = pa.schema(original_fields + [pa.field(f"{h.strip()}_score", pa.int16()) for h in header] +
+                                [pa.field(name, result_type) for name, result_type in zip(result_columns, self.result_types)])
+        self.writer = open_arrow_output(output_file_path, self.schema)
+
+    def write(self, results, source_batch=None):
+        if not results:
+            return
+        if self.passthrough:
+            columns = list(source_batch.columns)
+        else:
+            columns = [pa.array([result.row.get(h, "") for result in results], pa.string()) for h in self.header]
+        columns += [pa.array([result.field_scores[j] for result in results], pa.int16()) for j in range(len(self.header))]
+        columns += [arrow_result_array([result[k] for result in results], result_type) for k, result_type in enumerate(self.result_types, 2)]
+        self.writer.write_batch(pa.RecordBatch.from_arrays(columns, schema=self.schema))
+
+    def close(self):
+        self.writer.close()
+
+def open_result_writer(output_file_path, header, result_columns=RESULT_COLUMNS, source_schema=None, resume_offset=None):
+    """
+    Returns the result writer for the output file's format; source_schema is that of a Parquet/Arrow input.
+    A CSV output can be resumed at resume_offset; Parquet/Arrow outputs are always written from the start.
+    """
+    if get_file_format(output_file_path) == 'csv':
+        return CsvResultWriter(output_file_path, header, result_columns, resume_offset)
+    return ArrowResultWriter(output_file_path, header, result_columns, source_schema)
+
+def failed_fields_mask(field_scores):
+    """The failed_fields bitmask of a row as hex: bit j is set when the j-th column scored 0."""
+    return format(int(''.join('0' if score else '1' for score in reversed(field_scores)) or '0', 2), 'x')
+
+class SidecarResultWriter:
+    """
+    Writes the --results-only output: one row per input row with its Id and the SIDECAR_COLUMNS, as CSV or as
+    Parquet/Arrow, leaving the original values to be joined back from the input by Id.
+    """
+
+    def __init__(self, output_file_path, unique_id_column, resume_offset=None):
+        self.unique_id_column = unique_id_column
+        self.is_csv = get_file_format(output_file_path) == 'csv'
+        if self.is_csv:
+            self.outfile, self.writer = open_csv_output(output_file_path, [unique_id_column] + SIDECAR_COLUMNS, resume_offset)
+        else:
+            self.result_types = [getattr(pa, ARROW_RESULT_TYPES[name])() for name in SIDECAR_COLUMNS]
+            self.schema = pa.schema([pa.field(unique_id_column, pa.string())] + [pa.field(name, result_type) for name, result_type in zip(SIDECAR_COLUMNS, self.result_types)])
+            self.writer = open_arrow_output(output_file_path, self.schema)
+
+    def write(self, results, source_batch=None):
+        rows = [(result.row.get(self.unique_id_column, ""), result.total_row_score, result.final_status, failed_fields_mask(result.field_scores),
+                 result.duplicate_score, result.duplicate_of_id, result.match_key, result.cluster_size, result.is_cluster_survivor) for result in results]
+        if self.is_csv:
+            self.writer.writerows(rows)
+        elif rows:
+            columns = [pa.array([row[0] for row in rows], pa.string())]
+            columns += [arrow_result_array([row[k] for row in rows], result_type) for k, result_type in enumerate(self.result_types, 1)]
+            self.writer.write_batch(pa.RecordBatch.from_arrays(columns, schema=self.schema))
+
+    def flush(self):
+        return sync_csv_output(self.outfile)
+
+    def close(self):
+        if self.is_csv:
+            self.outfile.close()
+        else:
+            self.writer.close()
+
+def write_pairs(pairs_path, match_result, field_weights):
+    """
+    Writes the --pairs file: a row per duplicate row with its Id (id_a), the Id of its best match (id_b), the
+    duplicate score and the per-field similarity scores, empty where a field was not compared. Only each
+    duplicate's best match is listed, not every pair joined into its cluster, whose scores are not kept.
+    CSV or Parquet/Arrow, from the file extension. Returns the number of pairs.
+    """
+    header = ['id_a', 'id_b', 'score'] + [f"{field}_score" for field in field_weights]
+    row_ids, duplicate_of = match_result.row_ids, match_result.duplicate_of
+    pairs = [[row_ids[i], row_ids[match['original_index']], match['score']] + [match['field_scores'].get(field, "") for field in field_weights]
+             for i, match in sorted(duplicate_of.items())]
+    if get_file_format(pairs_path) == 'csv':
+        with open(pairs_path, mode='w', newline='', encoding='utf-8') as pairs_file:
+            writer = csv.writer(pairs_file)
+            writer.writerow(header)
+            writer.writerows(pairs)
+    else:
+        types = [pa.string(), pa.string()] + [pa.int16()] * (len(header) - 2)
+        columns = [pa.array([None if pair[k] == "" else pair[k] for pair in pairs], column_type) for k, column_type in enumerate(types)]
+        table = pa.Table.from_arrays(columns, schema=pa.schema([pa.field(name, column_type) for name, column_type in zip(header, types)]))
+        if get_file_format(pairs_path) == 'parquet':
+            pq.write_table(table, pairs_path)
+        else:
+            with pa.ipc.new_file(pairs_path, table.schema) as writer:
+                writer.write_table(table)
+    return len(pairs)
+
+def read_input_header(input_file_path):
+    """Returns the column names of a CSV, Parquet or Arrow file and, for Parquet/Arrow, its schema."""
+    if get_file_format(input_file_path) == 'csv':
+        with open(input_file_path, mode='r', newline='', encoding='utf-8-sig') as infile:
+            return list(csv.DictReader(infile).fieldnames or []), None
+    source_schema = read_arrow_schema(input_file_path)
+    return list(source_schema.names), source_schema
+
+def iter_input_rows(input_file_path, columns=None):
+    """Streams the rows of a CSV, Parquet or Arrow file as dicts of strings; columns limits the Parquet/Arrow columns read."""
+    if get_file_format(input_file_path) == 'csv':
+        return iter_csv_rows(input_file_path)
+    return iter_arrow_rows(input_file_path, columns)
+
+def iter_input_batches(input_file_path, csv_rows=None, stats=None, stage_name='pass2', skip_rows=0, start_offset=None):
+    """
+    Yields the input file RESULT_BATCH_ROWS rows at a time as (rows, batch): the rows as dicts of strings and
+    the Arrow record batch they were read from, or None for a CSV, so its columns can pass through to the
+    output. csv_rows are the rows of a CSV that is already in memory. The first skip_rows rows are skipped;
+    for a streamed CSV, start_offset is the byte offset of the first row to read.
+    """
+    if get_file_format(input_file_path) == 'csv':
+        if csv_rows is not None:
+            rows = csv_rows[skip_rows:] if skip_rows else csv_rows
+        elif start_offset is not None:
+            rows = iter_csv_rows(input_file_path, start_offset=start_offset)
+        else:
+            rows = islice(iter_csv_rows(input_file_path), skip_rows, None)
+        for chunk in iter_chunks(stats.timed_rows(f'{stage_name}.csv_parsing', rows) if stats else rows, RESULT_BATCH_ROWS):
+            yield chunk, None
+    else:
+        batch_rows = stats.timed(f'{stage_name}.arrow_parsing', arrow_batch_rows) if stats else arrow_batch_rows
+        for batch in iter_arrow_batches(input_file_path):
+            if skip_rows >= batch.num_rows:
+                skip_rows -= batch.num_rows
+                continue
+            if skip_rows:
+                batch, skip_rows = batch.slice(skip_rows), 0
+            yield batch_rows(batch), batch
+
+# --- Blocking ---
+
+def double_metaphone_keys(value):
+    """Both Double Metaphone codes of a value (once each), so spelling variants of a name share a block."""
+    return [code for code in dict.fromkeys(doublemetaphone(value)) if code]
+
+def metaphone_keys(value):
+    """The primary Double Metaphone code of a value only."""
+    code = doublemetaphone(value)[0]
+    return [code] if code else []
+
+def exact_keys(value):
+    """The normalized value itself."""
+    return [value]
+
+@lru_cache(maxsize=None)
+def minhash_permutations(count):
+    """The fixed coefficients (a, b) of `count` hash functions (a * x + b) mod MINHASH_PRIME, the same on every run."""
+    random_state = np.random.RandomState(MINHASH_SEED)
+    return random_state.randint(1, 1 << 32, size=count, dtype=np.uint64), random_state.randint(0, 1 << 32, size=count, dtype=np.uint64)
+
+@lru_cache(maxsize=NORMALIZATION_CACHE_SIZE)
+def minhash_keys(value, bands=MINHASH_BANDS, rows=MINHASH_ROWS):
+    """
+    MinHash LSH band keys of a value's character shingles. Two values share a block when the `rows` MinHash
+    values of any one of the `bands` bands agree, which is likely for values a typo apart and unlikely for
+    unrelated ones. More bands or fewer rows per band find more typo variants at the cost of more comparisons.
+    """
+    padded = f" {value} "
+    shingles = {padded[i:i + MINHASH_SHINGLE_SIZE] for i in range(max(len(padded) - MINHASH_SHINGLE_SIZE + 1, 1))}
+    # Shingles are hashed with crc32 rather than hash() so the keys are stable across processes and runs (--index)
+    hashes = np.fromiter((zlib.crc32(shingle.encode('utf-8')) for shingle in shingles), dtype=np.uint64, count=len(shingles))
+    a, b = minhash_permutations(bands * rows)
+    signature = ((np.outer(a, hashes) + b[:, None]) % MINHASH_PRIME).min(axis=1)
+    return [f"b{band}:{zlib.crc32(signature[band * rows:(band + 1) * rows].tobytes()):08x}" for band in range(bands)]
+
+def email_minhash_keys(value, bands=MINHASH_BANDS, rows=MINHASH_ROWS):
+    """minhash_keys of the local part of an email address only, since whole companies share the domain."""
+    return minhash_keys(value.partition('@')[0], bands, rows)
+
+# Ways of turning a normalized field value into block keys, selectable per field in a profile's BLOCKING_FIELDS
+BLOCKING_METHODS = {
+    'double_metaphone': double_metaphone_keys,
+    'metaphone': metaphone_keys,
+    'exact': exact_keys,
+    'minhash': minhash_keys,
+}
+
+def iter_bounded_results(executor, calls, max_pending):
+    """
+    Runs the calls (argument-free callables) in executor and yields their results as they complete, with no
+    more than max_pending submitted at once, so the arguments of calls not yet started are not all held.
+    """
+    pending = set()
+    for call in calls:
+        pending.add(executor.submit(call))
+        if len(pending) >= max_pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            yield from (future.result() for future in done)
+    yield from (future.result() for future in as_completed(pending))
+
+def score_block_chunk(deduplicator, tasks, collect_stats=False, scoring_workers=1):
+    """
+    Worker-process entry point for parallel Pass 1, also called in-process by the sharded Pass 1. Each task is (row_indexes, block_columns, start, base_size, window)
+    as described in BlockingIndex.work_units: every record from position `start` onwards is matched against
+    the records before it that the serial pass would compare it with.
+    Returns a list of (row_index, score, original_row_index, field_scores, matched_row_indexes) for the rows whose
+    best match is at or above the similarity threshold, and the task's --stats counters when collect_stats is set.
+    """
+    stats = RunStats() if collect_stats else None
+    start_cpu = time.process_time()
+    results = []
+    for row_indexes, block_columns, start, base_size, window in tasks:
+        for position in range(max(start, 1), len(row_indexes)):
+            current_record_normalized = {key: column[position] for key, column in block_columns.items()}
+            if window is None or position - base_size <= window:
+                candidate_columns = {key: column[:position] for key, column in block_columns.items()}
+                candidate_indexes = row_indexes[:position]
+            else:
+                candidate_columns = {key: column[:base_size] + column[position - window:position] for key, column in block_columns.items()}
+                candidate_indexes = row_indexes[:base_size] + row_indexes[position - window:position]
+            max_similarity_score, best_position, field_scores_for_log, match_positions = deduplicator.find_best_match(current_record_normalized, candidate_columns, scoring_workers=scoring_workers, stats=stats)
+            if max_similarity_score >= deduplicator.similarity_threshold:
+                matched_row_indexes = [candidate_indexes[p] for p in match_positions]
+                results.append((row_indexes[position], max_similarity_score, candidate_indexes[best_position], field_scores_for_log, matched_row_indexes))
+    if stats:
+        stats.add('worker_cpu_ms', int((time.process_time() - start_cpu) * 1000))
+    return results, stats.counters if stats else None
+
+# --- Deduplicator ---
+
+class Deduplicator:
+    """
+    Scores and dedupes records with one profile's settings: the match field weights, blocking fields,
+    similarity threshold and field scoring guide. The CLI scripts are thin profiles that build one from their
+    constants; a pipeline that already holds its records can call process_records() directly instead of
+    writing a CSV for them.
+
+    field_weights maps each match field to its weight (the weights sum to 100); blocking_fields maps each
+    blocking field to one of BLOCKING_METHODS; exact_match_keys are the match fields joined exactly before
+    fuzzy matching; sub_blocking_fields split blocks larger than max_block_size; minhash_bands and
+    minhash_rows tune the fields blocked with 'minhash'; progress prints what each pass is doing and draws
+    progress bars. Fields are looked up in a header by substring, so 'name' finds the 'Name' column.
+    """
+
+    def __init__(self, field_weights, blocking_fields, similarity_threshold, special_scoring_guide=None, grade_weights=None,
+                 unique_id_column='Id', exact_match_keys=(), sub_blocking_fields=(), max_block_size=None,
+                 minhash_bands=MINHASH_BANDS, minhash_rows=MINHASH_ROWS, progress=False):
+        unknown_methods = sorted(set(blocking_fields.values()).difference(BLOCKING_METHODS))
+        if unknown_methods:
+            raise ValueError(f"Unknown blocking method(s) {unknown_methods}; choose from {sorted(BLOCKING_METHODS)}.")
+        if max_block_size is not None and max_block_size <= 0:
+            raise ValueError(f"max_block_size must be a positive number of rows or None, not {max_block_size}.")
+        self.field_weights = dict(field_weights)
+        self.blocking_fields = dict(blocking_fields)
+        self.similarity_threshold = similarity_threshold
+        self.special_scoring_guide = dict(special_scoring_guide or {})
+        self.grade_weights = dict(grade_weights or DEFAULT_GRADE_WEIGHTS)
+        self.unique_id_column = unique_id_column
+        self.exact_match_keys = list(exact_match_keys)
+        self.sub_blocking_fields = list(sub_blocking_fields)
+        self.max_block_size = max_block_size
+        self.minhash_bands, self.minhash_rows = minhash_bands, minhash_rows
+        # Progress messages, block size histograms and progress bars; off for library calls, the CLI turns them on
+        self.progress = progress
+        # Block key function of each blocking field; MinHash fields get the profile's bands and rows
+        self.blockers = {}
+        for key, method in self.blocking_fields.items():
+            if method == 'minhash':
+                self.blockers[key] = partial(email_minhash_keys if key == 'email' else minhash_keys, bands=minhash_bands, rows=minhash_rows)
+            else:
+                self.blockers[key] = BLOCKING_METHODS[method]
+        # Pass 1 scores the match fields heaviest first so candidates that can no longer reach the threshold are dropped early.
+        self.scoring_field_order = sorted(self.field_weights, key=self.field_weights.get, reverse=True)
+        # Every field Pass 1 keeps per record, normalized once per row
+        self.record_fields = list(dict.fromkeys([*self.field_weights, *self.blocking_fields, *self.exact_match_keys, *self.sub_blocking_fields]))
+
+    def config_error(self, header):
+        """Returns why this profile cannot process data with this header, or None."""
+        weight_total = sum(self.field_weights.values())
+        if weight_total != 100:
+            return f"The values in DUPLICATE_FIELD_WEIGHTS must sum to 100, but they sum to {weight_total}."
+        if self.unique_id_column not in header:
+            return f"The specified UNIQUE_ID_COLUMN '{self.unique_id_column}' was not found in the CSV header.\nAvailable headers are: {list(header)}"
+        return None
+
+    def report(self, message):
+        """Prints a progress message when progress reporting is on; errors and warnings are always printed."""
+        if self.progress:
+            print(message)
+
+    def get_header_map(self, header):
+        """Maps each record field to the first column whose name contains it (None when there is none)."""
+        return {key: next((h for h in header if key in h.lower()), None) for key in self.record_fields}
+
+    # --- Field Scoring ---
+
+    def compile_scoring_plan(self, header):
+        """
+        Resolves everything about field scoring that depends only on the header - the grade from
+        the special scoring guide, its weight and the special checks - into one ColumnPlan per column.
+        """
+        scoring_plan = []
+        for col_name in header:
+            guide_key = next((g_key for g_key in self.special_scoring_guide if g_key in col_name.lower()), col_name.lower())
+            grade = self.special_scoring_guide.get(guide_key, 'c')
+            scoring_plan.append(ColumnPlan(col_name, grade, self.grade_weights.get(grade, 0), get_field_checks(col_name)))
+        return scoring_plan
+
+    # --- Matching ---
+
+    def find_best_match(self, current_record_normalized, candidate_columns, scoring_workers=None, stats=None):
+        """
+        Scores a record against a batch of earlier records and returns (max_similarity_score, best_position, field_scores_for_log, match_positions),
+        where candidate_columns maps each match field to the batch's values, best_position indexes the batch and
+        match_positions lists every candidate scoring at or above the similarity threshold.
+        The fields are scored heaviest first, each with a single process.cdist call over the candidates still in the running.
+        A candidate is dropped as soon as the weight of the fields left cannot lift it to the threshold, and each call
+        passes the lowest score any remaining candidate needs as score_cutoff. The survivors are combined with the
+        field weights in their usual order, giving exactly the same scores as comparing pair by pair.
+        Returns a score of 0 when no candidate reaches the threshold. Candidates must be in row order: on a tie the earliest candidate wins.
+        With stats (a RunStats) the candidate pairs and fuzzy comparisons are counted.
+        """
+        field_weights, similarity_threshold = self.field_weights, self.similarity_threshold
+        candidate_count = len(next(iter(candidate_columns.values())))
+        if stats:
+            stats.add('candidate_pairs', candidate_count)
+        if not candidate_count:
+            return 0, None, None, ()
+        if scoring_workers is None:
+            scoring_workers = -1 if candidate_count >= PARALLEL_SCORING_MIN_CANDIDATES else 1
+        # Empty fields on the record score 0 against every candidate and are skipped
+        scored_fields = [key for key in self.scoring_field_order if current_record_normalized[key]]
+        remaining_weight = sum(field_weights[key] for key in scored_fields)
+        positions = np.arange(candidate_count)
+        upper_bounds = np.zeros(candidate_count)  # Weighted score so far, in scoring order
+        field_scores = {}
+        for key in scored_fields:
+            weight = field_weights[key]
+            remaining_weight -= weight
+            # Lowest score on this field that keeps each candidate able to reach the threshold
+            needed_scores = (similarity_threshold - PRUNING_TOLERANCE - remaining_weight - upper_bounds) * (100.0 / weight) if weight else np.full(len(positions), -np.inf)
+            score_cutoff = max(float(needed_scores.min()), 0.0)
+            if score_cutoff > 100:
+                return 0, None, None, ()
+            column = candidate_columns[key]
+            choices = column if len(positions) == candidate_count else [column[p] for p in positions.tolist()]
+            if stats:
+                stats.add('fuzzy_calls', len(choices))
+            scores = process.cdist([current_record_normalized[key]], choices, scorer=fuzz.token_set_ratio, dtype=np.float64,
+                                   workers=scoring_workers, score_cutoff=score_cutoff)[0]
+            keep = scores >= needed_scores
+            positions, upper_bounds = positions[keep], upper_bounds[keep] + (scores[keep] / 100.0) * weight
+            for scored_key in field_scores:
+                field_scores[scored_key] = field_scores[scored_key][keep]
+            field_scores[key] = scores[keep]
+            if not len(positions):
+                return 0, None, None, ()
+        if not field_scores:
+            return 0, None, None, ()
+        # Recombine the survivors in field weight order so the float sums match the unpruned scorer bit for bit
+        weighted_scores = np.zeros(len(positions))
+        for key, weight in field_weights.items():
+            if key in field_scores:
+                weighted_scores += (field_scores[key] / 100.0) * weight
+        best = int(np.argmax(weighted_scores))
+        max_similarity_score = float(weighted_scores[best])
+        if max_similarity_score < similarity_threshold:
+            return 0, None, None, ()
+        best_position = int(positions[best])
+        field_scores_for_log = {key: int(field_scores[key][best]) for key in field_weights if key in field_scores and candidate_columns[key][best_position]}
+        match_positions = positions[weighted_scores >= similarity_threshold].tolist()
+        return max_similarity_score, best_position, field_scores_for_log, match_positions
+
+    def score_pair(self, current_record_normalized, original_record_normalized):
+        """
+        Weighted similarity of two records, summed the same way as find_best_match but kept whatever the score.
+        Used for exact-key matches. Returns (similarity_score, field_scores_for_log).
+        """
+        similarity_score = 0.0
+        field_scores_for_log = {}
+        for key, weight in self.field_weights.items():
+            new_val = current_record_normalized[key]
+            if not new_val:
+                continue
+            score = fuzz.token_set_ratio(new_val, original_record_normalized[key])
+            similarity_score += (score / 100.0) * weight
+            if original_record_normalized[key]:
+                field_scores_for_log[key] = int(score)
+        return similarity_score, field_scores_for_log
+
+    def get_block_tasks(self, seen_records_blocked):
+        """
+        Splits the blocks of a blocking index into chunks of about PARALLEL_CHUNK_COMPARISONS comparisons each.
+        A chunk lists (row_indexes, start, base_size, window) pieces; score_blocks gathers each piece's records
+        just before the chunk is scored, so only the chunks in flight hold copies of the records.
+        """
+        # Split large blocks into row ranges of about PARALLEL_CHUNK_COMPARISONS comparisons and pack the pieces into tasks
+        chunks, current_chunk, current_cost = [], [], 0
+        for row_indexes, start, base_size, window in seen_records_blocked.work_units():
+            comparisons = lambda position: position if window is None else base_size + min(position - base_size, window)
+            start = max(start, 1)
+            while start < len(row_indexes):
+                end, cost = start + 1, comparisons(start)
+                while end < len(row_indexes) and cost + comparisons(end) <= PARALLEL_CHUNK_COMPARISONS:
+                    cost += comparisons(end)
+                    end += 1
+                if current_chunk and current_cost + cost > PARALLEL_CHUNK_COMPARISONS:
+                    chunks.append(current_chunk)
+                    current_chunk, current_cost = [], 0
+                # Only send the rows this piece is compared with: the parent block plus the trailing window
+                keep_from = base_size if window is None else max(base_size, start - window)
+                piece_indexes = row_indexes[:base_size] + row_indexes[keep_from:end] if window is not None else row_indexes[:end]
+                piece_start = start if window is None else base_size + start - keep_from
+                current_chunk.append((piece_indexes, piece_start, base_size, window))
+                current_cost += cost
+                start = end
+        if current_chunk:
+            chunks.append(current_chunk)
+        return chunks
+
+    def score_blocks(self, record_store, seen_records_blocked, best_matches, match_clusters, executor=None, workers=1, stats=None, row_map=None, desc="Finding Duplicates"):
+        """
+        Scores every block of the blocking index, in executor's worker processes or, without one, in this
+        process, and merges the per-block results into best_matches ({row_index: (score, original_row_index,
+        field_scores)}), adding every above-threshold pair to match_clusters. row_map translates the index's
+        row indexes into those of the whole input. A row can only match rows before it, and when blocks
+        disagree the highest score wins with ties going to the earliest row, which is exactly the match the
+        serial pass picks. At most two chunks per worker are in flight at a time.
+        """
+        chunks = self.get_block_tasks(seen_records_blocked)
+        gather = lambda chunk: [(row_indexes, record_store.gather(row_indexes), start, base_size, window) for row_indexes, start, base_size, window in chunk]
+        if executor is not None:
+            chunk_results = iter_bounded_results(executor, (partial(score_block_chunk, self, gather(chunk), bool(stats)) for chunk in chunks), 2 * workers)
+        else:
+            chunk_results = (score_block_chunk(self, gather(chunk), bool(stats), scoring_workers=None) for chunk in chunks)
+        translate = row_map.__getitem__ if row_map is not None else (lambda row_index: row_index)
+        for results, task_counters in tqdm(chunk_results, total=len(chunks), desc=desc, unit="task", disable=not self.progress):
+            if stats:
+                if executor is None:
+                    task_counters.pop('worker_cpu_ms', None)  # Already counted in this process's stage CPU time
+                stats.update(task_counters)
+            for row_index, score, original_index, field_scores, matched_row_indexes in results:
+                row_index, original_index = translate(row_index), translate(original_index)
+                for matched_row_index in matched_row_indexes:
+                    match_clusters.union(row_index, translate(matched_row_index))
+                current = best_matches.get(row_index)
+                if current is None or score > current[0] or (score == current[0] and original_index < current[1]):
+                    best_matches[row_index] = (score, original_index, field_scores)
+
+    def find_best_matches_parallel(self, record_store, seen_records_blocked, match_clusters, workers, stats=None):
+        """
+        Scores every block of the blocking index in a pool of worker processes; returns
+        {row_index: (score, original_row_index, field_scores)} as described in score_blocks.
+        """
+        best_matches = {}
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            self.score_blocks(record_store, seen_records_blocked, best_matches, match_clusters, executor, workers, stats)
+        return best_matches
+
+    def get_blocking_keys(self, record_normalized):
+        """
+        Returns the block keys of a record: 'field:key' for each non-empty blocking field and each key its
+        blocking method gives.
+        """
+        blocking_keys = []
+        for key, blocker in self.blockers.items():
+            value = record_normalized.get(key, "")
+            if value:
+                blocking_keys.extend(f"{key}:{block_key}" for block_key in blocker(value))
+        return blocking_keys
+
+    def get_exact_match_key(self, record_normalized):
+        """Returns the exact-match key of a record, or None when any of its exact-match fields is empty."""
+        values = [EXACT_KEY_REDUCERS[key](record_normalized[key]) if key in EXACT_KEY_REDUCERS else record_normalized[key] for key in self.exact_match_keys]
+        return "\x1f".join(values) if values and all(values) else None
+
+    def get_sub_block_key(self, record_normalized):
+        """
+        Secondary key used to split oversized blocks: a short prefix of the first non-empty
+        sub-blocking field value (the last digits for phone numbers, the local part for emails).
+        """
+        for key in self.sub_blocking_fields:
+            value = record_normalized.get(key)
+            if value:
+                if key == 'phone':
+                    return f"{key}:{value[-SUB_BLOCK_KEY_LENGTH:]}"
+                if key == 'email':
+                    value = value.partition('@')[0]
+                return f"{key}:{value[:SUB_BLOCK_KEY_LENGTH]}"
+        return ""
+
+    def find_matches(self, rows, header_map, workers=1, block_stats_path=None, stats=None, checkpoint=None):
+        """
+        Pass 1: normalizes every row and matches it to the first earlier row with the same exact-match key
+        with a dictionary lookup. Only rows without such a row are blocked and scored against the rows before
+        them in their blocks.
+        With a Checkpoint the state is saved periodically, and a loaded checkpoint's state is continued from;
+        rows then starts at the first row it does not cover.
+        Returns (row_ids, best_matches, match_clusters, completeness): the Id of each row, the best match of
+        each duplicate row, the above-threshold pairs joined in a DisjointSet, and a function returning the
+        number of filled match fields of a row.
+        """
+        max_block_size = self.max_block_size
+        if checkpoint and checkpoint.pass1_state:
+            record_store, seen_records_blocked, best_matches, match_clusters, exact_match_rows, exact_match_count = checkpoint.pass1_state
+        else:
+            record_store = RecordStore(self.record_fields)
+            seen_records_blocked = BlockingIndex(max_block_size)
+            best_matches = {}  # Maps row index to (score, original row index, per-field scores)
+            match_clusters = DisjointSet()
+            exact_match_rows = {}  # Maps exact-match key to the first row with it
+            exact_match_count = 0
+        # With --stats the sub-stages are timed by wrapping the functions the loop calls; otherwise they are called directly
+        timed = get_timer(stats)
+        normalize = timed('pass1.normalize', normalize_record)
+        blocking_keys_of = timed('pass1.blocking_keys', self.get_blocking_keys)
+        candidates = timed('pass1.candidate_gathering', seen_records_blocked.candidates)
+        gather = timed('pass1.candidate_gathering', record_store.gather)
+        best_match = timed('pass1.fuzzy_scoring', partial(self.find_best_match, stats=stats) if stats else self.find_best_match)
+        exact_match = timed('pass1.exact_match', self.score_pair)
+
+        # With several workers the blocking index is built first and the blocks are scored in worker processes.
+        self.report("Pass 1: Finding all duplicate pairs..." if workers <= 1 else f"Pass 1: Building blocking index for {workers} workers...")
+        with checkpoint.deferred_stop() if checkpoint else nullcontext():
+            for i, row_dict in enumerate(tqdm(stats.timed_rows('pass1.csv_parsing', rows) if stats else rows, desc="Finding Duplicates" if workers <= 1 else "Building Index", unit="row", initial=len(record_store), disable=not self.progress), len(record_store)):
+                # Saved between rows only, so the state always covers whole rows
+                if checkpoint and (checkpoint.stop_signal or checkpoint.due()):
+                    checkpoint.save(pass1_state=(record_store, seen_records_blocked, best_matches, match_clusters, exact_match_rows, exact_match_count))
+                    checkpoint.stop_if_requested()
+                current_record_normalized = normalize(row_dict, header_map)
+                # Exact-key stage: the row joins the first row with its key and stays out of the blocks
+                exact_key = self.get_exact_match_key(current_record_normalized)
+                first_row = exact_match_rows.setdefault(exact_key, i) if exact_key else i
+                if first_row != i:
+                    max_similarity_score, field_scores_for_log = exact_match(current_record_normalized, record_store.record(first_row))
+                    best_matches[i] = (max_similarity_score, first_row, field_scores_for_log)
+                    match_clusters.union(i, first_row)
+                    record_store.append(current_record_normalized, row_dict.get(self.unique_id_column))
+                    exact_match_count += 1
+                    continue
+                blocking_keys = blocking_keys_of(current_record_normalized)
+                sub_block_key = self.get_sub_block_key(current_record_normalized) if max_block_size else None
+                if workers <= 1:
+                    # Remove duplicates across blocks with an integer set and score in row order so ties resolve to the earliest row
+                    if len(blocking_keys) == 1:
+                        candidate_indexes = candidates(blocking_keys[0], sub_block_key)
+                    else:
+                        candidate_indexes = sorted(set().union(*(candidates(block_key, sub_block_key) for block_key in blocking_keys)))
+                    if candidate_indexes:
+                        max_similarity_score, best_position, field_scores_for_log, match_positions = best_match(current_record_normalized, gather(candidate_indexes))
+                        if max_similarity_score >= self.similarity_threshold:
+                            best_matches[i] = (max_similarity_score, candidate_indexes[best_position], field_scores_for_log)
+                            for position in match_positions:
+                                match_clusters.union(i, candidate_indexes[position])
+                # Store the record once and add its row index to all blocks
+                record_store.append(current_record_normalized, row_dict.get(self.unique_id_column))
+                for block_key in blocking_keys:
+                    seen_records_blocked.add(block_key, sub_block_key, i)
+            if checkpoint and checkpoint.stop_signal:
+                checkpoint.save(pass1_state=(record_store, seen_records_blocked, best_matches, match_clusters, exact_match_rows, exact_match_count))
+                checkpoint.stop_if_requested()
+
+        if workers > 1:
+            best_matches.update(self.find_best_matches_parallel(record_store, seen_records_blocked, match_clusters, workers, stats))
+        if stats:
+            stats.add('rows', len(record_store))
+            stats.add('exact_key_matches', exact_match_count)
+            stats.add('matches_above_threshold', sum(1 for score, _, _ in best_matches.values() if score >= self.similarity_threshold))
+            stats.count_blocks(seen_records_blocked)
+        if self.exact_match_keys:
+            self.report(f"Exact-key stage: {exact_match_count} rows matched on {' + '.join(self.exact_match_keys)} without fuzzy matching.")
+        report_block_sizes(seen_records_blocked, block_stats_path, self.progress)
+        return record_store.unique_ids, best_matches, match_clusters, record_store.completeness
+
+    def find_matches_sharded(self, rows, header_map, memory_budget_mb, workers=1, spill_dir=None, size_hint=0, block_stats_path=None, stats=None):
+        """
+        Out-of-core Pass 1 for --memory-budget, with the same results as find_matches. The normalized records
+        are hash-partitioned to spill files in spill_dir: by exact-match key, and by block key (a record goes to
+        the partition of each of its block keys). The exact-match partitions are resolved first, one shard at a
+        time, which settles which rows stay out of the blocks. Then each shard of block partitions is loaded in
+        row order into its own RecordStore and BlockingIndex, scored like the blocks of a --workers run, and its
+        best matches merged with the earliest-row-wins rule. Only the row Ids, a completeness byte per row and
+        the match maps are held for the whole input.
+        size_hint (the input file size) sets the number of partitions so a single partition fits the budget.
+        """
+        memory_budget_bytes = memory_budget_mb * 1024 * 1024
+        # A record is spilled once per block key (one per band for 'minhash') and once more for its exact-match key
+        spill_copies = sum(self.minhash_bands if method == 'minhash' else 1 for method in self.blocking_fields.values()) + bool(self.exact_match_keys)
+        partition_count = min(MAX_SPILL_PARTITIONS, max(MIN_SPILL_PARTITIONS, math.ceil(size_hint * spill_copies * SPILL_MEMORY_FACTOR / memory_budget_bytes)))
+        fields, max_block_size = self.record_fields, self.max_block_size
+        row_ids, completeness = [], bytearray()
+        best_matches = {}  # Maps row index to (score, original row index, per-field scores)
+        match_clusters = DisjointSet()
+        block_tally = BlockSizeTally(max_block_size)
+        exact_match_count = 0
+        timed = get_timer(stats)
+        normalize = timed('pass1.normalize', normalize_record)
+        blocking_keys_of = timed('pass1.blocking_keys', self.get_blocking_keys)
+        exact_match = timed('pass1.exact_match', self.score_pair)
+
+        with tempfile.TemporaryDirectory(prefix='blankcheck-', dir=spill_dir) as spill_path:
+            exact_spill = SpillFiles(os.path.join(spill_path, 'exact'), partition_count)
+            block_spill = SpillFiles(os.path.join(spill_path, 'block'), partition_count)
+            self.report(f"Pass 1: Partitioning records into {partition_count} spill files for a {memory_budget_mb} MB memory budget...")
+            try:
+                for i, row_dict in enumerate(tqdm(stats.timed_rows('pass1.csv_parsing', rows) if stats else rows, desc="Partitioning", unit="row", disable=not self.progress)):
+                    record_normalized = normalize(row_dict, header_map)
+                    values = tuple(record_normalized[key] for key in fields)
+                    row_ids.append(row_dict.get(self.unique_id_column))
+                    completeness.append(sum(1 for value in values if value))
+                    exact_key = self.get_exact_match_key(record_normalized)
+                    if exact_key:
+                        exact_spill.add(exact_spill.partition_of(exact_key), (i, exact_key, values))
+                    # Whether the row joins an earlier row's exact-match key is only known after the exact-match
+                    # partitions are resolved, so every row is spilled and the matched ones are skipped when loading
+                    sub_block_key = self.get_sub_block_key(record_normalized) if max_block_size else None
+                    keys_by_partition = defaultdict(list)
+                    for block_key in blocking_keys_of(record_normalized):
+                        keys_by_partition[block_spill.partition_of(block_key)].append(block_key)
+                    for partition, block_keys in keys_by_partition.items():
+                        block_spill.add(partition, (i, block_keys, sub_block_key, values))
+            finally:
+                exact_spill.close()
+                block_spill.close()
+            spill_bytes = exact_spill.total_size() + block_spill.total_size()
+
+            # Exact-key stage, shard by shard: every row with a key joins the first row with it
+            exact_matched = bytearray(len(row_ids))
+            for partitions in tqdm(exact_spill.shards(memory_budget_bytes), desc="Exact-Key Matching", unit="shard", disable=not self.progress):
+                first_rows = {}  # Maps exact-match key to (first row index, its values)
+                for i, exact_key, values in exact_spill.read_merged(partitions):
+                    first_row, first_values = first_rows.setdefault(exact_key, (i, values))
+                    if first_row != i:
+                        max_similarity_score, field_scores_for_log = exact_match(dict(zip(fields, values)), dict(zip(fields, first_values)))
+                        best_matches[i] = (max_similarity_score, first_row, field_scores_for_log)
+                        match_clusters.union(i, first_row)
+                        exact_matched[i] = 1
+                        exact_match_count += 1
+
+            # Blocking and fuzzy scoring, shard by shard; the remaining rows of each shard are loaded in row order
+            block_shards = block_spill.shards(memory_budget_bytes)
+            self.report(f"Scoring {len(block_shards)} shard(s) from {spill_bytes / (1024 * 1024):.1f} MB of spill files...")
+            with ProcessPoolExecutor(max_workers=workers) if workers > 1 else nullcontext() as executor:
+                for shard_number, partitions in enumerate(block_shards, 1):
+                    record_store = RecordStore(fields)
+                    seen_records_blocked = BlockingIndex(max_block_size)
+                    shard_rows = array('Q')  # Maps the shard's row indexes to those of the whole input
+                    for i, block_keys, sub_block_key, values in block_spill.read_merged(partitions):
+                        if exact_matched[i]:
+                            continue
+                        # A row whose block keys fall in several of the shard's partitions is stored once
+                        if not shard_rows or shard_rows[-1] != i:
+                            record_store.append(dict(zip(fields, values)), None)
+                            shard_rows.append(i)
+                        for block_key in block_keys:
+                            seen_records_blocked.add(block_key, sub_block_key, len(shard_rows) - 1)
+                    self.score_blocks(record_store, seen_records_blocked, best_matches, match_clusters, executor, workers, stats, shard_rows,
+                                      desc=f"Scoring Shard {shard_number}/{len(block_shards)}")
+                    block_tally.add(seen_records_blocked)
+                    del record_store, seen_records_blocked, shard_rows
+
+        if stats:
+            stats.add('rows', len(row_ids))
+            stats.add('exact_key_matches', exact_match_count)
+            stats.add('matches_above_threshold', sum(1 for score, _, _ in best_matches.values() if score >= self.similarity_threshold))
+            stats.add('spill_bytes', spill_bytes)
+            stats.add('shards', len(block_shards))
+            stats.count_blocks(block_tally)
+        if self.exact_match_keys:
+            self.report(f"Exact-key stage: {exact_match_count} rows matched on {' + '.join(self.exact_match_keys)} without fuzzy matching.")
+        report_block_sizes(block_tally, block_stats_path, self.progress)
+        return row_ids, best_matches, match_clusters, completeness.__getitem__
+
+    # --- Persistent Dedupe Index (--index) ---
+
+    def get_index_fingerprint(self):
+        """Describes the match settings an index was built with; an index built with other settings is rebuilt."""
+        fingerprint = {
+            'version': INDEX_FORMAT_VERSION,
+            'weights': self.field_weights,
+            'blocking': self.blocking_fields,
+            'exact_match_keys': self.exact_match_keys,
+            'threshold': self.similarity_threshold,
+        }
+        if 'minhash' in self.blocking_fields.values():
+            fingerprint['minhash'] = [MINHASH_SHINGLE_SIZE, self.minhash_bands, self.minhash_rows]
+        return json.dumps(fingerprint, sort_keys=True)
+
+    def get_run_key(self, input_file_path, output_file_path, stream, workers, results_only=False):
+        """Identifies a run for --resume: its input file as it was, its output, match settings and mode."""
+        input_stat = os.stat(input_file_path)
+        return json.dumps({
+            'settings': self.get_index_fingerprint(),
+            'max_block_size': self.max_block_size,
+            'input': [os.path.abspath(input_file_path), input_stat.st_size, input_stat.st_mtime_ns],
+            'output': os.path.abspath(output_file_path),
+            'stream': stream,
+            'parallel': workers > 1,
+            'results_only': results_only,
+        }, sort_keys=True)
+
+    def match_indexed_record(self, position, record_normalized, candidate_indexes, record_store, best, pairs):
+        """
+        Scores the record at `position` of an incremental run against its candidates and stores its best
+        match in `best` and its above-threshold pairs in `pairs`. Returns the pairs added.
+        """
+        if not candidate_indexes:
+            return []
+        max_similarity_score, best_position, field_scores_for_log, match_positions = self.find_best_match(record_normalized, record_store.gather(candidate_indexes))
+        if max_similarity_score < self.similarity_threshold:
+            return []
+        best[position] = (max_similarity_score, candidate_indexes[best_position], field_scores_for_log)
+        new_pairs = [(candidate_indexes[p], position) for p in match_positions]
+        pairs.update(new_pairs)
+        return new_pairs
+
+    def find_matches_incremental(self, index_path, rows, header_map, original_header, stats=None):
+        """
+        Pass 1 against the persistent dedupe index at index_path (--index): an SQLite copy of the normalized
+        records, block postings, best matches and above-threshold pairs of earlier runs, kept in the order the
+        records were first seen. Only rows whose Id is new or whose row hash changed are normalized and scored,
+        and a changed row is re-inserted as the newest record. Records whose best match was removed or changed
+        are rescored against the records before them, so the result is that of a full run over the current
+        records in first-seen order.
+        Returns (row_ids, best_matches, match_clusters, completeness) like find_matches, keyed by row in the current file.
+        """
+        fields = self.record_fields
+        connection = sqlite3.connect(index_path)
+        try:
+            connection.executescript(INDEX_SCHEMA)
+            fingerprint = self.get_index_fingerprint()
+            stored_fingerprint = connection.execute("SELECT value FROM meta WHERE key = 'fingerprint'").fetchone()
+            if stored_fingerprint is None or stored_fingerprint[0] != fingerprint:
+                if stored_fingerprint is not None:
+                    print("The dedupe index was built with different match settings and will be rebuilt.")
+                with connection:
+                    for table in ('records', 'postings', 'pairs'):
+                        connection.execute(f"DELETE FROM {table}")
+                    connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('fingerprint', ?)", (fingerprint,))
+
+            # --- Load the index: positions follow the order the records were first seen ---
+            self.report("Pass 1: Loading dedupe index...")
+            record_store = RecordStore(fields)
+            seen_records_blocked = BlockingIndex()
+            seqs, row_hashes, position_of_key, position_of_seq = [], [], {}, {}
+            best = {}  # Maps position to (score, original position, per-field scores)
+            for seq, record_key, unique_id, row_hash, data, best_seq, best_score, best_scores in connection.execute(
+                    "SELECT seq, record_key, unique_id, row_hash, data, best_seq, best_score, best_scores FROM records ORDER BY seq"):
+                position = len(seqs)
+                position_of_seq[seq] = position
+                position_of_key[record_key] = position
+                seqs.append(seq)
+                row_hashes.append(row_hash)
+                record_store.append(dict(zip(fields, json.loads(data))), unique_id)
+                if best_seq is not None:
+                    best[position] = (best_score, position_of_seq[best_seq], json.loads(best_scores))
+            for block_key, seq in connection.execute("SELECT block_key, seq FROM postings ORDER BY seq"):
+                seen_records_blocked.add(block_key, None, position_of_seq[seq])
+            pairs = {(position_of_seq[seq_a], position_of_seq[seq_b]) for seq_a, seq_b in connection.execute("SELECT seq_a, seq_b FROM pairs")}
+            indexed_count = len(seqs)
+
+            # --- Compare the file with the index by Id and row hash ---
+            row_ids, file_positions, pending = [], [], []
+            occurrences = defaultdict(int)
+            for i, row_dict in enumerate(tqdm(rows, desc="Checking Rows", unit="row", disable=not self.progress)):
+                unique_id = row_dict.get(self.unique_id_column)
+                record_key = f"{unique_id}\x1f{occurrences[unique_id]}"
+                occurrences[unique_id] += 1
+                row_hash = get_row_hash(row_dict, original_header)
+                row_ids.append(unique_id)
+                position = position_of_key.get(record_key)
+                if position is not None and row_hashes[position] == row_hash:
+                    file_positions.append(position)
+                else:
+                    file_positions.append(None)
+                    current_record_normalized = normalize_record(row_dict, header_map)
+                    pending.append((i, record_key, row_hash, current_record_normalized))
+
+            # Changed and deleted records leave the index; records that matched them best are rescored
+            removed = set(range(indexed_count)).difference(position for position in file_positions if position is not None)
+            pairs = {pair for pair in pairs if pair[0] not in removed and pair[1] not in removed}
+            rescore = {position for position, (_, best_position, _) in best.items() if best_position in removed and position not in removed}
+            for position in removed:
+                best.pop(position, None)
+
+            # A record that becomes the first with its exact-match key because the earlier one left the index
+            # joins the blocks, and the later records in those blocks are rescored against it
+            exact_match_rows, first_rows, promoted_postings = {}, {}, []
+            for position in range(indexed_count):
+                exact_key = self.get_exact_match_key(record_store.record(position))
+                if exact_key is None or exact_key in exact_match_rows:
+                    continue
+                first_row = first_rows.setdefault(exact_key, position)
+                if position in removed:
+                    continue
+                exact_match_rows[exact_key] = position
+                if first_row != position:
+                    for block_key in self.get_blocking_keys(record_store.record(position)):
+                        rescore.update(c for c in seen_records_blocked.candidates(block_key) if c > position and c not in removed)
+                        seen_records_blocked.add(block_key, None, position)
+                        promoted_postings.append((block_key, position))
+                    rescore.add(position)
+
+            def match_record(position, record_normalized):
+                """Exact-key stage, then fuzzy matching against the live records before `position` in its blocks."""
+                exact_key = self.get_exact_match_key(record_normalized)
+                first_row = exact_match_rows.setdefault(exact_key, position) if exact_key else position
+                if first_row < position:
+                    max_similarity_score, field_scores_for_log = self.score_pair(record_normalized, record_store.record(first_row))
+                    best[position] = (max_similarity_score, first_row, field_scores_for_log)
+                    pairs.add((first_row, position))
+                    return [(first_row, position)], []
+                blocking_keys = self.get_blocking_keys(record_normalized)
+                candidate_indexes = sorted(c for c in set().union(*(seen_records_blocked.candidates(block_key) for block_key in blocking_keys)) if c < position and c not in removed)
+                return self.match_indexed_record(position, record_normalized, candidate_indexes, record_store, best, pairs), blocking_keys
+
+            new_pairs, new_records = [], []
+            for i, record_key, row_hash, current_record_normalized in tqdm(pending, desc="Finding Duplicates", unit="row", disable=not self.progress):
+                position = len(record_store)
+                matched_pairs, blocking_keys = match_record(position, current_record_normalized)
+                new_pairs.extend(matched_pairs)
+                record_store.append(current_record_normalized, row_ids[i])
+                for block_key in blocking_keys:
+                    seen_records_blocked.add(block_key, None, position)
+                file_positions[i] = position
+                new_records.append((position, record_key, row_hash, blocking_keys))
+            rescore = sorted(rescore)
+            for position in rescore:
+                best.pop(position, None)
+                new_pairs.extend(match_record(position, record_store.record(position))[0])
+
+            # --- Save the changes back to the index ---
+            next_seq = seqs[-1] + 1 if seqs else 1
+            with connection:
+                removed_seqs = [(seqs[position],) for position in removed]
+                connection.executemany("DELETE FROM records WHERE seq = ?", removed_seqs)
+                connection.executemany("DELETE FROM postings WHERE seq = ?", removed_seqs)
+                connection.executemany("DELETE FROM pairs WHERE seq_a = ?", removed_seqs)
+                connection.executemany("DELETE FROM pairs WHERE seq_b = ?", removed_seqs)
+                for position, record_key, row_hash, blocking_keys in new_records:
+                    seqs.append(next_seq)
+                    next_seq += 1
+                    score, best_position, field_scores = best.get(position, (None, None, None))
+                    connection.execute(
+                        "INSERT INTO records (seq, record_key, unique_id, row_hash, data, best_seq, best_score, best_scores) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                        (seqs[position], record_key, record_store.unique_ids[position], row_hash, json.dumps([record_store.columns[key][position] for key in fields]),
+                         seqs[best_position] if best_position is not None else None, score, json.dumps(field_scores) if field_scores is not None else None))
+                    connection.executemany("INSERT INTO postings (block_key, seq) VALUES (?, ?)", [(block_key, seqs[position]) for block_key in blocking_keys])
+                for position in rescore:
+                    score, best_position, field_scores = best.get(position, (None, None, None))
+                    connection.execute("UPDATE records SET best_seq = ?, best_score = ?, best_scores = ? WHERE seq = ?",
+                                       (seqs[best_position] if best_position is not None else None, score, json.dumps(field_scores) if field_scores is not None else None, seqs[position]))
+                connection.executemany("INSERT INTO postings (block_key, seq) VALUES (?, ?)", [(block_key, seqs[position]) for block_key, position in promoted_postings])
+                connection.executemany("INSERT OR IGNORE INTO pairs (seq_a, seq_b) VALUES (?, ?)", [(seqs[a], seqs[b]) for a, b in new_pairs])
+        finally:
+            connection.close()
+        if stats:
+            stats.update({'rows': len(row_ids), 'index_unchanged_rows': indexed_count - len(removed), 'index_new_rows': len(new_records),
+                          'index_removed_rows': len(removed), 'index_rescored_rows': len(rescore)})
+        self.report(f"Dedupe index: {indexed_count - len(removed)} unchanged, {len(new_records)} new or changed, {len(removed)} removed, {len(rescore)} rescored.")
+
+        file_row_of = {position: i for i, position in enumerate(file_positions)}
+        best_matches = {file_row_of[position]: (score, file_row_of[best_position], field_scores) for position, (score, best_position, field_scores) in best.items()}
+        match_clusters = DisjointSet()
+        for position_a, position_b in pairs:
+            match_clusters.union(file_row_of[position_a], file_row_of[position_b])
+        return row_ids, best_matches, match_clusters, lambda i: record_store.completeness(file_positions[i])
+
+    # --- Running ---
+
+    def match(self, rows, header, workers=1, index_path=None, block_stats_path=None, stats=None, checkpoint=None,
+              memory_budget_mb=None, spill_dir=None, size_hint=0):
+        """
+        Runs Pass 1 over rows (dicts keyed by the header) and groups the matches into clusters.
+        With memory_budget_mb, Pass 1 runs out of core (see find_matches_sharded).
+        Returns a MatchResult for iter_results().
+        """
+        # --stats: stages are timed with stage(); without it stage() does nothing
+        stage = get_stage(stats)
+        header_map = self.get_header_map(header)
+        duplicate_of = {}
+        matched_by = defaultdict(list)  # Maps row index to the (row index, score) of the first rows matched to it
+        matched_by_count = defaultdict(int)
+
+        # --- PASS 1: FIND ALL DUPLICATE PAIRS ---
+        with stage('pass1'):
+            if index_path:
+                row_ids, best_matches, match_clusters, completeness = self.find_matches_incremental(index_path, rows, header_map, header, stats)
+            elif memory_budget_mb:
+                row_ids, best_matches, match_clusters, completeness = self.find_matches_sharded(rows, header_map, memory_budget_mb, workers, spill_dir, size_hint,
+                                                                                               block_stats_path, stats)
+            else:
+                row_ids, best_matches, match_clusters, completeness = self.find_matches(rows, header_map, workers, block_stats_path, stats, checkpoint)
+
+        with stage('clustering'):
+            # Record the matches in row order so serial and parallel mode list them the same way
+            for i in sorted(best_matches):
+                max_similarity_score, original_index, field_scores_for_log = best_matches[i]
+                details_str = ", ".join([f"{k.capitalize()}:{v}" for k,v in field_scores_for_log.items()])
+                duplicate_of[i] = {
+                    'score': int(max_similarity_score),
+                    'details': f"Best match with row {original_index + 1} [ID: {row_ids[original_index]}] ({details_str})",
+                    'original_index': original_index,
+                    'field_scores': field_scores_for_log,
+                }
+                matched_by_count[original_index] += 1
+                if len(matched_by[original_index]) < MAX_MATCHED_BY_LISTED:
+                    matched_by[original_index].append((i, int(max_similarity_score)))
+
+            # --- CLUSTERING: Group all above-threshold pairs transitively ---
+            cluster_of = assign_clusters(match_clusters, completeness)
+        return MatchResult(row_ids, duplicate_of, matched_by, matched_by_count, cluster_of)
+
+    def iter_results(self, rows, header, match_result, debug=False, stats=None, start=0):
+        """
+        Pass 2: scores the fields of each row and yields its RowResult with the match flags from match_result.
+        start is the row index of the first row, for when the rows come in batches.
+        """
+        row_ids, duplicate_of, matched_by, matched_by_count, cluster_of = match_result
+        scoring_plan = self.compile_scoring_plan(header)
+        score = stats.timed('pass2.field_scoring', score_row) if stats else score_row
+
+        for i, row_dict in enumerate(rows, start):
+            scores_list, total_row_score, any_a_field_failed = score(row_dict, scoring_plan, debug)
+            final_status = "Fail" if any_a_field_failed else "Pass"
+
+            dupe_info = duplicate_of.get(i)
+            original_info = matched_by.get(i)
+
+            final_score_val = dupe_info['score'] if dupe_info else ""
+            final_details = dupe_info['details'] if dupe_info else ""
+            duplicate_of_id = row_ids[dupe_info['original_index']] if dupe_info else ""
+            is_matched_to_details = ""
+            if original_info:
+                is_matched_to_details = "; ".join([f"Matched by row {dupe_index + 1} [ID: {row_ids[dupe_index]}] (Score: {score})" for dupe_index, score in original_info])
+                if matched_by_count[i] > len(original_info):
+                    is_matched_to_details += f"; and {matched_by_count[i] - len(original_info)} more"
+
+            # --- NEW: Set the final boolean flag ---
+            is_involved_flag = True if dupe_info or original_info else False
+            # --- Add the match cluster to the row ---
+            match_key_val, cluster_size, survivor_index = cluster_of.get(i, ("", "", None))
+            is_survivor = (survivor_index == i) if survivor_index is not None else ""
+            yield RowResult(row_dict, scores_list, total_row_score, final_status, final_score_val, final_details, is_matched_to_details, is_involved_flag, match_key_val, cluster_size, is_survivor, duplicate_of_id)
+
+    def process_records(self, records, header=None, debug=False, workers=1, index_path=None, block_stats_path=None, stats=None):
+        """
+        Scores and dedupes an iterable of row dicts in memory - for example records already fetched from the
+        Salesforce Bulk API - and yields a RowResult per row in input order, with no CSV written or read.
+        Values that are not strings, such as the ints, bools and None of API records, are converted as a CSV
+        would hold them (None as an empty string); result.row is the converted row. The header defaults to the
+        keys of the first record. Every record is matched before the first result is yielded, since a row can
+        be matched by any later row. Raises ValueError when the profile cannot run on the header.
+        """
+        rows = [coerce_record(record) for record in records]
+        header = list(header) if header is not None else list(rows[0]) if rows else [self.unique_id_column]
+        error = self.config_error(header)
+        if error:
+            raise ValueError(error)
+        match_result = self.match(rows, header, workers, index_path, block_stats_path, stats)
+        yield from self.iter_results(rows, header, match_result, debug, stats)
+
+    def process_csv(self, input_file_path, output_file_path, debug=False, workers=1, stream=False, block_stats_path=None, index_path=None, stats_path=None,
+                    checkpoint_path=None, resume=False, results_only=False, pairs_path=None, memory_budget_mb=None, spill_dir=None):
+        # --memory-budget: the input is streamed rather than loaded, and Pass 1 runs on spill files
+        stream = stream or bool(memory_budget_mb)
+        # --stats: stages are timed with stage(); without it stage() does nothing
+        stats = RunStats() if stats_path else None
+        stage = get_stage(stats)
+        try:
+            input_format, output_format = get_file_format(input_file_path), get_file_format(output_file_path)
+            if pyarrow_missing(input_file_path, output_file_path, pairs_path):
+                return False
+            if checkpoint_path and workers > 1:
+                print("Error: --checkpoint cannot be combined with --workers; the block scoring in worker processes is not checkpointed.")
+                return False
+            if index_path and workers > 1:
+                print("Error: --index cannot be combined with --workers; the index is scored serially.")
+                return False
+            if index_path and self.max_block_size:
+                print(f"Warning: MAX_BLOCK_SIZE ({self.max_block_size}) is ignored with --index; its blocks are not split.")
+            # --checkpoint: save the run's state as it goes; --resume: continue from the state saved last time
+            checkpoint = Checkpoint(checkpoint_path, self.get_run_key(input_file_path, output_file_path, stream, workers, results_only)) if checkpoint_path else None
+            if checkpoint and resume and checkpoint.load():
+                self.report(f"Resuming from the checkpoint at {checkpoint_path}.")
+            start_row = len(checkpoint.pass1_state[0]) if checkpoint and checkpoint.pass1_state else 0
+            if input_format == 'csv':
+                # --- PRE-LOAD: Read all data into memory to allow for a two-pass approach ---
+                # In streaming mode only the header is read here; both passes read the rows straight from the file.
+                with open(input_file_path, mode='r', newline='', encoding='utf-8-sig') as infile, stage('read_csv'):
+                    reader = csv.DictReader(infile)
+                    original_header = list(reader.fieldnames)
+                    error = self.config_error(original_header)
+                    if error:
+                        print(f"Error: {error}")
+                        return False
+                    all_rows = None if stream else list(reader)
+                source_schema = None
+                row_offsets = array('Q') if stream else None  # Byte offset of each row in the input file
+                if checkpoint:
+                    if checkpoint.row_offsets is not None:
+                        row_offsets = checkpoint.row_offsets
+                    checkpoint.row_offsets = row_offsets
+                if not stream:
+                    rows = all_rows[start_row:] if start_row else all_rows
+                elif start_row and start_row >= len(row_offsets):
+                    # Saved after the last row was processed: Pass 1 has no rows left to read
+                    rows = iter(())
+                else:
+                    # The checkpoint has read one row past its cursor; continue from that row's offset
+                    start_offset = None
+                    if start_row:
+                        start_offset = row_offsets[start_row]
+                        del row_offsets[start_row:]
+                    rows = iter_csv_rows(input_file_path, row_offsets, start_offset)
+            else:
+                # Parquet/Arrow input: Pass 1 reads only the Id and match columns, Pass 2 reads the file batch by batch
+                with stage('read_arrow'):
+                    source_schema = read_arrow_schema(input_file_path)
+                    original_header = list(source_schema.names)
+                    error = self.config_error(original_header)
+                    if error:
+                        print(f"Error: {error}")
+                        return False
+                match_columns = [h for h in dict.fromkeys([self.unique_id_column, *self.get_header_map(original_header).values()]) if h]
+                rows = iter_arrow_rows(input_file_path, match_columns)
+                if start_row:
+                    rows = islice(rows, start_row, None)
+                all_rows = row_offsets = None
+
+            if checkpoint and checkpoint.match_result is not None:
+                self.report("Pass 1 and clustering were completed before; continuing with Pass 2.")
+                match_result = checkpoint.match_result
+            else:
+                match_result = self.match(rows, original_header, workers, index_path, block_stats_path, stats, checkpoint,
+                                          memory_budget_mb, spill_dir, os.path.getsize(input_file_path))
+                if checkpoint:
+                    checkpoint.save(match_result=match_result)
+            if pairs_path:
+                pair_count = write_pairs(pairs_path, match_result, self.field_weights)
+                self.report(f"{pair_count} duplicate pairs saved to: {pairs_path}")
+
+            # --- PASS 2: BUILD OUTPUT WITH ALL FLAGS ---
+            self.report("\nPass 2: Generating final output file with all flags...")
+            with stage('pass2'):
+                # --resume: a CSV output continues after the last batch flushed; other outputs are rewritten
+                start, resume_offset = 0, None
+                progress_saved = checkpoint.pass2_progress if checkpoint and output_format == 'csv' else None
+                if progress_saved and os.path.exists(output_file_path) and os.path.getsize(output_file_path) >= progress_saved['output_offset']:
+                    start, resume_offset = progress_saved['rows_written'], progress_saved['output_offset']
+                    self.report(f"Continuing the output after row {start}.")
+                if results_only:
+                    writer = SidecarResultWriter(output_file_path, self.unique_id_column, resume_offset)
+                else:
+                    writer = open_result_writer(output_file_path, original_header, RESULT_COLUMNS, source_schema, resume_offset)
+                write = stats.timed('pass2.writing', writer.write) if stats else writer.write
+                input_offset = row_offsets[start] if stream and row_offsets and 0 < start < len(row_offsets) else None
+                try:
+                    # Each batch's results are written next to the batch itself so Parquet/Arrow columns pass straight through
+                    with tqdm(total=len(match_result.row_ids), desc="Writing Output", unit="row", initial=start, disable=not self.progress) as progress:
+                        for batch_rows, batch in iter_input_batches(input_file_path, all_rows, stats, skip_rows=start, start_offset=input_offset):
+                            write(list(self.iter_results(batch_rows, original_header, match_result, debug, stats, start)), batch)
+                            start += len(batch_rows)
+                            progress.update(len(batch_rows))
+                            if checkpoint and output_format == 'csv':
+                                checkpoint.save_pass2(start, writer.flush())
+                finally:
+                    writer.close()
+            if checkpoint:
+                checkpoint.remove()
+
+            self.report(f"\nProcessing complete. The output file is saved at: {output_file_path}")
+            if stats:
+                stats.write(stats_path)
+                self.report(f"Run statistics saved to: {stats_path}")
+            return True
+
+        except FileNotFoundError:
+            print(f"Error: The file '{input_file_path}' was not found.")
+        except Exception as e:
+            print(f"An unexpected error occurred: {e}")
+            import traceback
+            traceback.print_exc()
+        return False
+
+    # --- Reference Matching (--reference) ---
+
+    def build_reference_index(self, rows, header, block_stats_path=None, stats=None):
+        """
+        Normalizes the rows of a reference file (e.g. the existing Accounts) once and builds their blocking index
+        and exact-match table. Reference rows are never matched with each other.
+        """
+        header_map = self.get_header_map(header)
+        record_store = RecordStore(self.record_fields)
+        blocks = BlockingIndex(self.max_block_size)
+        exact_match_rows = {}  # Maps exact-match key to the first reference row with it
+        timed = get_timer(stats)
+        normalize = timed('reference.normalize', normalize_record)
+        blocking_keys_of = timed('reference.blocking_keys', self.get_blocking_keys)
+        for i, row_dict in enumerate(tqdm(stats.timed_rows('reference.csv_parsing', rows) if stats else rows, desc="Indexing Reference", unit="row", disable=not self.progress)):
+            record_normalized = normalize(row_dict, header_map)
+            record_store.append(record_normalized, row_dict.get(self.unique_id_column))
+            exact_key = self.get_exact_match_key(record_normalized)
+            if exact_key:
+                exact_match_rows.setdefault(exact_key, i)
+            sub_block_key = self.get_sub_block_key(record_normalized) if self.max_block_size else None
+            for block_key in blocking_keys_of(record_normalized):
+                blocks.add(block_key, sub_block_key, i)
+        if stats:
+            stats.add('reference_rows', len(record_store))
+            stats.count_blocks(blocks)
+        report_block_sizes(blocks, block_stats_path, self.progress)
+        return ReferenceIndex(record_store, blocks, exact_match_rows)
+
+    def match_reference_record(self, reference_index, record_normalized, stats=None):
+        """
+        Returns the best reference match of a normalized record as (score, reference_row, field_scores, match_count),
+        or None when no reference record reaches the similarity threshold. As in the exact-key stage of Pass 1,
+        the first reference row with the record's exact-match key is taken whatever its score.
+        """
+        record_store, blocks, exact_match_rows = reference_index
+        exact_key = self.get_exact_match_key(record_normalized)
+        reference_row = exact_match_rows.get(exact_key) if exact_key else None
+        if reference_row is not None:
+            if stats:
+                stats.add('exact_key_matches')
+            score, field_scores_for_log = self.score_pair(record_normalized, record_store.record(reference_row))
+            return score, reference_row, field_scores_for_log, 1
+        sub_block_key = self.get_sub_block_key(record_normalized) if self.max_block_size else None
+        blocking_keys = self.get_blocking_keys(record_normalized)
+        if len(blocking_keys) == 1:
+            candidate_indexes = blocks.candidates(blocking_keys[0], sub_block_key)
+        else:
+            candidate_indexes = sorted(set().union(*(blocks.candidates(block_key, sub_block_key) for block_key in blocking_keys)))
+        if not candidate_indexes:
+            return None
+        max_similarity_score, best_position, field_scores_for_log, match_positions = self.find_best_match(record_normalized, record_store.gather(candidate_indexes), stats=stats)
+        if max_similarity_score < self.similarity_threshold:
+            return None
+        return max_similarity_score, candidate_indexes[best_position], field_scores_for_log, len(match_positions)
+
+    def iter_reference_results(self, reference_index, rows, header, debug=False, stats=None):
+        """
+        Scores the fields of each row, matches it against the reference index and yields a ReferenceResult.
+        The rows are never indexed or matched with each other, so each costs only its own lookups and they
+        can be streamed.
+        """
+        header_map = self.get_header_map(header)
+        scoring_plan = self.compile_scoring_plan(header)
+        reference_ids = reference_index.record_store.unique_ids
+        timed = get_timer(stats)
+        normalize = timed('query.normalize', normalize_record)
+        match_reference = timed('query.matching', partial(self.match_reference_record, stats=stats) if stats else self.match_reference_record)
+        score = timed('query.field_scoring', score_row)
+        row_count = match_count = 0
+        for row_dict in rows:
+            row_count += 1
+            scores_list, total_row_score, any_a_field_failed = score(row_dict, scoring_plan, debug)
+            final_status = "Fail" if any_a_field_failed else "Pass"
+            match = match_reference(reference_index, normalize(row_dict, header_map))
+            if match is None:
+                yield ReferenceResult(row_dict, scores_list, total_row_score, final_status, "", "", "", 0)
+                continue
+            match_count += 1
+            max_similarity_score, reference_row, field_scores_for_log, reference_match_count = match
+            details_str = ", ".join([f"{k.capitalize()}:{v}" for k,v in field_scores_for_log.items()])
+            details = f"Best match with reference row {reference_row + 1} [ID: {reference_ids[reference_row]}] ({details_str})"
+            yield ReferenceResult(row_dict, scores_list, total_row_score, final_status, int(max_similarity_score), reference_ids[reference_row], details, reference_match_count)
+        if stats:
+            stats.update({'rows': row_count, 'reference_matches': match_count})
+
+    def process_reference(self, reference_file_path, input_file_path, output_file_path, debug=False, block_stats_path=None, stats_path=None):
+        """
+        --reference: builds the blocking index over the reference file once, then streams the input file through
+        it and writes each row's field scores and best reference match. Input rows are not matched with each
+        other, so the cost grows linearly with the input.
+        """
+        stats = RunStats() if stats_path else None
+        stage = get_stage(stats)
+        try:
+            if pyarrow_missing(reference_file_path, input_file_path, output_file_path):
+                return False
+            reference_header, _ = read_input_header(reference_file_path)
+            original_header, source_schema = read_input_header(input_file_path)
+            for header in (reference_header, original_header):
+                error = self.config_error(header)
+                if error:
+                    print(f"Error: {error}")
+                    return False
+
+            self.report("Pass 1: Indexing reference records...")
+            with stage('reference_index'):
+                reference_columns = [h for h in dict.fromkeys([self.unique_id_column, *self.get_header_map(reference_header).values()]) if h]
+                reference_index = self.build_reference_index(iter_input_rows(reference_file_path, reference_columns), reference_header, block_stats_path, stats)
+
+            self.report("\nPass 2: Matching rows against the reference...")
+            with stage('query'):
+                writer = open_result_writer(output_file_path, original_header, REFERENCE_RESULT_COLUMNS, source_schema)
+                write = stats.timed('query.writing', writer.write) if stats else writer.write
+                try:
+                    with tqdm(desc="Matching Rows", unit="row", disable=not self.progress) as progress:
+                        for batch_rows, batch in iter_input_batches(input_file_path, None, stats, 'query'):
+                            write(list(self.iter_reference_results(reference_index, batch_rows, original_header, debug, stats)), batch)
+                            progress.update(len(batch_rows))
+                finally:
+                    writer.close()
+
+            self.report(f"\nProcessing complete. The output file is saved at: {output_file_path}")
+            if stats:
+                stats.write(stats_path)
+                self.report(f"Run statistics saved to: {stats_path}")
+            return True
+
+        except FileNotFoundError as e:
+            print(f"Error: The file '{e.filename}' was not found.")
+        except Exception as e:
+            print(f"An unexpected error occurred: {e}")
+            import traceback
+            traceback.print_exc()
+        return False
+
+# --- Command Line ---
+
+def main(deduplicator):
+    """Command-line entry point shared by the profile scripts."""
+    parser = argparse.ArgumentParser(description="Validates, scores, and performs robust, weighted record-level duplicate checking on CSV data.")
+    parser.add_argument("input_file", help="Path to the input CSV file.")
+    parser.add_argument("-o", "--output_file", help="Path for the output CSV file. (Optional)")
+    parser.add_argument("--debug", action="store_true", help="Enable debug mode to print detailed scoring information.")
+    parser.add_argument("--workers", type=int, default=1, help="Number of worker processes used to score the blocks in Pass 1. (Default: 1)")
+    parser.add_argument("--stream", action="store_true", help="Stream the input instead of loading it into memory. Pass 1 keeps only the normalized match fields of each row and Pass 2 re-reads the file.")
+    parser.add_argument("--max-block-size", type=int, help="Split blocking-index blocks larger than this by a secondary key to bound comparisons per row. (Default: the profile's MAX_BLOCK_SIZE)")
+    parser.add_argument("--block-stats", help="Write block size statistics for the run to this JSON file. (Optional)")
+    parser.add_argument("--index", help="Keep a persistent SQLite dedupe index at this path and only score new or changed rows against it on later runs. It cannot be combined with --workers or --max-block-size. (Optional)")
+    parser.add_argument("--stats", help="Write per-stage wall/CPU time, counters and peak memory for the run to this JSON file. (Optional)")
+    parser.add_argument("--reference", help="Match each input row against this reference file (e.g. the existing Accounts) instead of deduping the input against itself. The reference is indexed once and the input is streamed through it; it cannot be combined with --index, --workers or --stream. (Optional)")
+    parser.add_argument("--results-only", action="store_true", help="Write only the Id and result columns of each row instead of the original values and per-field scores.")
+    parser.add_argument("--pairs", help="Write each duplicate row's Id, its best match's Id, the score and the per-field scores to this file. Only the best match of each duplicate is listed, not every pair in its cluster. (Optional)")
+    parser.add_argument("--memory-budget", type=int, metavar="MB", help="Run Pass 1 out of core: spill the normalized records to disk, partitioned by block key, and score them in shards estimated to need about this many MB each; the row Ids, match maps and Pass 2 are not included. Results are identical to the in-memory run. (Optional)")
+    parser.add_argument("--spill-dir", help="Directory for the --memory-budget spill files. (Default: the system temporary directory)")
+    parser.add_argument("--checkpoint", help="Save the state of the run to this file as it goes (Pass 1 every few minutes, Pass 2 after every batch) so an interrupted run can be continued with --resume. (Optional)")
+    parser.add_argument("--resume", action="store_true", help="Continue an interrupted run from its --checkpoint file instead of starting over.")
+    parser.add_argument("--profile", help="Run under cProfile, write the profile to this file and print the slowest functions. (Optional)")
+    parser.add_argument("--graph", action="store_true", help="Generate interactive HTML graphs summarizing the results.")
+    args = parser.parse_args()
+    if args.output_file:
+        output_path = args.output_file
+    else:
+        base, ext = os.path.splitext(args.input_file)
+        output_path = f"{base}_results{ext}" if args.results_only else f"{base}_processed{ext}"
+    deduplicator.progress = True
+    if args.max_block_size is not None and args.max_block_size <= 0:
+        print("Error: --max-block-size must be a positive number of rows.")
+        return
+    if args.max_block_size is not None:
+        deduplicator.max_block_size = args.max_block_size
+    if args.reference and args.index:
+        print("Error: --index cannot be combined with --reference; the reference file is indexed on every run.")
+        return
+    if args.reference and (args.workers > 1 or args.stream):
+        print("Error: --workers and --stream do not apply to --reference runs, which index the reference in memory and stream the input serially.")
+        return
+    if args.reference and (args.results_only or args.pairs):
+        print("Error: --results-only and --pairs do not apply to --reference runs, whose output already has the reference match Id.")
+        return
+    if args.index and (args.workers > 1 or args.max_block_size is not None):
+        print("Error: --index cannot be combined with --workers or --max-block-size; the index is scored serially and its blocks are not split.")
+        return
+    if args.checkpoint and (args.index or args.reference):
+        print("Error: --checkpoint cannot be combined with --index or --reference.")
+        return
+    if args.checkpoint and args.workers > 1:
+        print("Error: --checkpoint cannot be combined with --workers; the block scoring in worker processes is not checkpointed.")
+        return
+    if args.memory_budget is not None and args.memory_budget <= 0:
+        print("Error: --memory-budget must be a positive number of MB.")
+        return
+    if args.memory_budget and (args.index or args.reference or args.checkpoint):
+        print("Error: --memory-budget cannot be combined with --index, --reference or --checkpoint.")
+        return
+    if args.resume and not args.checkpoint:
+        print("Error: --resume needs the --checkpoint file of the run to continue.")
+        return
+    if args.reference:
+        run, run_args = deduplicator.process_reference, (args.reference, args.input_file, output_path, args.debug, args.block_stats, args.stats)
+    else:
+        run, run_args = deduplicator.process_csv, (args.input_file, output_path, args.debug, args.workers, args.stream, args.block_stats, args.index, args.stats,
+                                                    args.checkpoint, args.resume, args.results_only, args.pairs, args.memory_budget, args.spill_dir)
+    if args.profile:
+        profiler = cProfile.Profile()
+        profiler.runcall(run, *run_args)
+        profiler.dump_stats(args.profile)
+        pstats.Stats(profiler).sort_stats('cumulative').print_stats(PROFILE_TOP_N)
+        print(f"Profile saved to: {args.profile}")
+    else:
+        run(*run_args)
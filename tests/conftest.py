@@ -0,0 +1,34 @@
+import os
+import sys
+import csv
+import importlib.util
+
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [REPO_DIR, os.path.join(REPO_DIR, 'benchmarks')]
+
+from generate_data import generate
+
+PROFILES = {
+    'contact': os.path.join(REPO_DIR, 'accountBlankCheck0.7_Contact.py'),
+    'account': os.path.join(REPO_DIR, 'accountBlankCheck0.5_Account_Lead.py'),
+}
+
+def load_deduplicator(kind):
+    """A fresh Deduplicator from a profile script, so a test can change its settings without affecting others."""
+    spec = importlib.util.spec_from_file_location(f"profile_{kind}", PROFILES[kind])
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module.DEDUPLICATOR
+
+@pytest.fixture
+def generated_rows(tmp_path):
+    """Returns make(kind, rows, seed) -> (header, rows) for a generated CSV with known duplicates."""
+    def make(kind, rows, seed=0):
+        input_path, truth_path = tmp_path / f"{kind}_{rows}_{seed}.csv", tmp_path / f"{kind}_{rows}_{seed}_truth.csv"
+        generate(kind, rows, str(input_path), str(truth_path), seed=seed)
+        with open(input_path, newline='', encoding='utf-8') as infile:
+            reader = csv.DictReader(infile)
+            return list(reader.fieldnames), list(reader)
+    return make
@@ -0,0 +1,70 @@
+import os
+import signal
+
+import pytest
+
+import blankcheck
+from conftest import load_deduplicator
+from generate_data import generate
+
+ROWS = 600
+
+@pytest.fixture
+def input_csv(tmp_path):
+    input_path = tmp_path / 'contacts.csv'
+    generate('contact', ROWS, str(input_path), str(tmp_path / 'truth.csv'), seed=5)
+    return str(input_path)
+
+def uninterrupted_output(input_csv, tmp_path, stream):
+    output_path = tmp_path / 'expected.csv'
+    assert load_deduplicator('contact').process_csv(input_csv, str(output_path), stream=stream)
+    return output_path.read_bytes()
+
+def stop_pass1_at_row(monkeypatch, row):
+    """Sends SIGTERM, as the deferred handler records it, while Pass 1 processes the given row."""
+    calls = []
+    def due(self):
+        calls.append(None)
+        if len(calls) == row + 1:
+            self.stop_signal = signal.SIGTERM
+        return False
+    monkeypatch.setattr(blankcheck.Checkpoint, 'due', due)
+
+@pytest.mark.parametrize('stream', [False, True])
+@pytest.mark.parametrize('stop_row', [0, ROWS // 2, ROWS - 1])
+def test_resume_after_pass1_stop_gives_the_uninterrupted_output(stream, stop_row, input_csv, tmp_path, monkeypatch):
+    expected = uninterrupted_output(input_csv, tmp_path, stream)
+    output_path, checkpoint_path = tmp_path / 'out.csv', str(tmp_path / 'run.ckpt')
+
+    with monkeypatch.context() as patch:
+        stop_pass1_at_row(patch, stop_row)
+        with pytest.raises(SystemExit):
+            load_deduplicator('contact').process_csv(input_csv, str(output_path), stream=stream, checkpoint_path=checkpoint_path)
+    assert os.path.exists(checkpoint_path)
+    assert load_deduplicator('contact').process_csv(input_csv, str(output_path), stream=stream, checkpoint_path=checkpoint_path, resume=True)
+    assert not os.path.exists(checkpoint_path)
+
+    assert output_path.read_bytes() == expected
+
+@pytest.mark.parametrize('stream', [False, True])
+def test_resume_after_pass2_stop_gives_the_uninterrupted_output(stream, input_csv, tmp_path, monkeypatch):
+    monkeypatch.setattr(blankcheck, 'RESULT_BATCH_ROWS', 100)
+    expected = uninterrupted_output(input_csv, tmp_path, stream)
+    output_path, checkpoint_path = tmp_path / 'out.csv', str(tmp_path / 'run.ckpt')
+
+    save_pass2 = blankcheck.Checkpoint.save_pass2
+    def stop_after_second_batch(self, rows_written, output_offset):
+        save_pass2(self, rows_written, output_offset)
+        if rows_written == 200:
+            raise KeyboardInterrupt
+    with monkeypatch.context() as patch:
+        patch.setattr(blankcheck.Checkpoint, 'save_pass2', stop_after_second_batch)
+        with pytest.raises(KeyboardInterrupt):
+            load_deduplicator('contact').process_csv(input_csv, str(output_path), stream=stream, checkpoint_path=checkpoint_path)
+    assert os.path.exists(f"{checkpoint_path}.pass2")
+    # Rows after the last flushed batch are written again, not appended twice
+    with open(output_path, 'ab') as output_file:
+        output_file.write(b'partial row that was never flushed')
+    assert load_deduplicator('contact').process_csv(input_csv, str(output_path), stream=stream, checkpoint_path=checkpoint_path, resume=True)
+
+    assert output_path.read_bytes() == expected
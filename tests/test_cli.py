@@ -0,0 +1,26 @@
+import sys
+
+import pytest
+
+import blankcheck
+from conftest import load_deduplicator
+
+def run_main(monkeypatch, capsys, *args):
+    monkeypatch.setattr(sys, 'argv', ['blankcheck', *args])
+    blankcheck.main(load_deduplicator('contact'))
+    return capsys.readouterr().out
+
+@pytest.mark.parametrize('max_block_size', ['0', '-1'])
+def test_max_block_size_must_be_positive(max_block_size, monkeypatch, capsys, tmp_path):
+    output = run_main(monkeypatch, capsys, str(tmp_path / 'missing.csv'), '--max-block-size', max_block_size)
+    assert "Error: --max-block-size must be a positive number of rows." in output
+
+@pytest.mark.parametrize('max_block_size', [0, -1])
+def test_deduplicator_rejects_a_max_block_size_below_one(max_block_size):
+    with pytest.raises(ValueError):
+        blankcheck.Deduplicator({'name': 100}, {'name': 'metaphone'}, 80, max_block_size=max_block_size)
+
+@pytest.mark.parametrize('option', [['--workers', '2'], ['--stream']])
+def test_reference_rejects_workers_and_stream(option, monkeypatch, capsys, tmp_path):
+    output = run_main(monkeypatch, capsys, str(tmp_path / 'missing.csv'), '--reference', str(tmp_path / 'reference.csv'), *option)
+    assert "Error: --workers and --stream do not apply to --reference runs" in output
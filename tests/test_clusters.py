@@ -0,0 +1,42 @@
+import blankcheck
+
+def test_chained_matches_form_one_cluster_rooted_at_the_earliest_row():
+    match_clusters = blankcheck.DisjointSet()
+    match_clusters.union(5, 2)  # A (row 5) matched B (row 2)
+    match_clusters.union(7, 5)  # C (row 7) matched A
+    match_clusters.union(9, 3)
+    assert {root: list(members) for root, members in match_clusters.clusters().items()} == {2: [2, 5, 7], 3: [3, 9]}
+    assert {match_clusters.find(row_index) for row_index in (2, 5, 7)} == {2}
+
+    # Rows 5 and 7 have the most match fields filled; row 5 survives as the earlier one. Rows 3 and 9 tie.
+    completeness = {2: 1, 5: 3, 7: 3, 3: 2, 9: 2}.get
+    assert blankcheck.assign_clusters(match_clusters, completeness) == {
+        2: (1, 3, 5), 5: (1, 3, 5), 7: (1, 3, 5),
+        3: (2, 2, 3), 9: (2, 2, 3),
+    }
+
+    # A match between the two clusters merges them under the earliest root
+    match_clusters.union(9, 7)
+    assert list(match_clusters.clusters()) == [2]
+    assert blankcheck.assign_clusters(match_clusters, completeness)[3] == (1, 5, 5)
+
+def test_match_key_is_transitive_in_the_output():
+    # C only matches B (on phone) and B only matches A (on name), yet all three share a match_key
+    deduplicator = blankcheck.Deduplicator({'name': 50, 'phone': 50}, {'name': 'exact', 'phone': 'exact'}, 50)
+    header = ['Id', 'name', 'phone']
+    rows = [
+        {'Id': 'X', 'name': 'Zeta', 'phone': ''},
+        {'Id': 'A', 'name': 'Acme', 'phone': ''},
+        {'Id': 'B', 'name': 'Acme', 'phone': '555 1234'},
+        {'Id': 'C', 'name': 'Globex', 'phone': '555 1234'},
+        {'Id': 'Y', 'name': 'Zeta', 'phone': ''},
+        {'Id': 'Z', 'name': 'Solo', 'phone': '999 0000'},
+    ]
+    results = {result.row['Id']: result for result in deduplicator.process_records(rows, header)}
+
+    assert [results[row_id].duplicate_of_id for row_id in 'ABC'] == ['', 'A', 'B']
+    # Cluster ids follow the earliest row: X's cluster starts at row 0, A's at row 1
+    assert [(results[row_id].match_key, results[row_id].cluster_size) for row_id in 'XYABC'] == [(1, 2)] * 2 + [(2, 3)] * 3
+    # B and C both fill two match fields; B is the earlier. X and Y tie too, so X survives.
+    assert [results[row_id].is_cluster_survivor for row_id in 'XYABC'] == [True, False, False, True, False]
+    assert (results['Z'].match_key, results['Z'].cluster_size, results['Z'].is_cluster_survivor) == ("", "", "")
@@ -0,0 +1,16 @@
+import blankcheck
+from conftest import load_deduplicator
+
+def test_website_exact_key_uses_the_host():
+    deduplicator = load_deduplicator('account')
+    header = ['Id', 'name', 'website', 'phone']
+    rows = [
+        {'Id': '0', 'name': 'Acme Holdings', 'website': 'acme.com', 'phone': '555-0100'},
+        {'Id': '1', 'name': 'Zenith Widgets', 'website': 'https://www.acme.com/home', 'phone': '(555) 0100'},
+    ]
+    header_map = deduplicator.get_header_map(header)
+    keys = [deduplicator.get_exact_match_key(blankcheck.normalize_record(row, header_map)) for row in rows]
+    assert keys[0] is not None and keys[0] == keys[1]
+    # Kept as a duplicate although the names are far below SIMILARITY_THRESHOLD
+    results = list(deduplicator.process_records(rows, header))
+    assert results[1].duplicate_of_id == '0'
@@ -0,0 +1,99 @@
+from collections import defaultdict
+
+import pytest
+
+import blankcheck
+from conftest import load_deduplicator
+
+def indexed_run(deduplicator, rows, header, index_path):
+    stats = blankcheck.RunStats()
+    results = list(deduplicator.process_records(rows, header, index_path=str(index_path), stats=stats))
+    return results, stats.counters
+
+def full_run(deduplicator, rows, header):
+    return list(deduplicator.process_records(rows, header))
+
+def matches_by_id(results):
+    """Each row's best match and score and the Ids in its cluster, keyed by Id, so runs over rows in another order compare."""
+    members = defaultdict(set)
+    for result in results:
+        members[result.match_key].add(result.row['Id'])
+    return {result.row['Id']: (result.duplicate_of_id, result.duplicate_score, frozenset(members[result.match_key]) if result.match_key else None)
+            for result in results}
+
+@pytest.fixture
+def contact_rows(generated_rows):
+    header, rows = generated_rows('contact', 900, seed=11)
+    return header, rows
+
+def test_index_runs_give_the_results_of_a_full_run(contact_rows, tmp_path):
+    header, rows = contact_rows
+    deduplicator = load_deduplicator('contact')
+    index_path = tmp_path / 'index.sqlite'
+
+    # First run builds the index
+    base = rows[:600]
+    results, counters = indexed_run(deduplicator, base, header, index_path)
+    assert results == full_run(deduplicator, base, header)
+    assert counters['index_new_rows'] == 600
+    assert any(result.duplicate_of_id for result in results)
+
+    # Rerun without changes: nothing is scored again
+    results, counters = indexed_run(deduplicator, base, header, index_path)
+    assert results == full_run(deduplicator, base, header)
+    assert (counters['index_new_rows'], counters['index_removed_rows'], counters['index_rescored_rows']) == (0, 0, 0)
+
+    # Appended rows
+    results, counters = indexed_run(deduplicator, rows, header, index_path)
+    assert results == full_run(deduplicator, rows, header)
+    assert counters['index_new_rows'] == 300
+
+    # Deleted rows, including rows other rows matched best, whose duplicates are rescored
+    matched = sorted({int(result.duplicate_match_details.split('row ')[1].split(' ')[0]) - 1 for result in results if result.duplicate_of_id})
+    deleted = set(matched[::3]) | set(range(0, len(rows), 17))
+    remaining = [row for i, row in enumerate(rows) if i not in deleted]
+    results, counters = indexed_run(deduplicator, remaining, header, index_path)
+    assert results == full_run(deduplicator, remaining, header)
+    assert counters['index_removed_rows'] == len(deleted)
+    assert counters['index_rescored_rows'] > 0
+
+def test_changed_rows_are_matched_as_the_newest_records(contact_rows, tmp_path):
+    header, rows = contact_rows
+    deduplicator = load_deduplicator('contact')
+    index_path = tmp_path / 'index.sqlite'
+    indexed_run(deduplicator, rows, header, index_path)
+
+    # Change rows that others matched: a changed row is re-inserted as the newest record, so the full run to
+    # compare with has the changed rows moved to the end
+    first_results = full_run(deduplicator, rows, header)
+    matched_ids = {result.duplicate_of_id for result in first_results if result.duplicate_of_id}
+    changed_ids = set(sorted(matched_ids)[::4])
+    changed = [dict(row, Phone=row['Phone'] + '9') if row['Id'] in changed_ids else row for row in rows]
+    results, counters = indexed_run(deduplicator, changed, header, index_path)
+    assert counters['index_new_rows'] == counters['index_removed_rows'] == len(changed_ids)
+
+    first_seen_order = [row for row in changed if row['Id'] not in changed_ids] + [row for row in changed if row['Id'] in changed_ids]
+    assert matches_by_id(results) == matches_by_id(full_run(deduplicator, first_seen_order, header))
+
+def test_deleting_the_first_row_of_an_exact_key_promotes_the_next_into_the_blocks(tmp_path):
+    # B joins A by email and stays out of the blocks, so C, which only resembles B, has no match. Once A is
+    # deleted, B is the first row with the email: it must join the name blocks and C must be rescored against it.
+    deduplicator = blankcheck.Deduplicator({'name': 100}, {'name': 'metaphone'}, 80, exact_match_keys=['email'])
+    header = ['Id', 'name', 'email']
+    a = {'Id': 'A', 'name': 'Acme Widgets', 'email': 'sales@acme.com'}
+    b = {'Id': 'B', 'name': 'Zenith Tools', 'email': 'sales@acme.com'}
+    c = {'Id': 'C', 'name': 'Zenith Toolz', 'email': 'info@zenith.com'}
+    index_path = tmp_path / 'index.sqlite'
+
+    results, _ = indexed_run(deduplicator, [a, b, c], header, index_path)
+    assert [result.duplicate_of_id for result in results] == ['', 'A', '']
+
+    results, counters = indexed_run(deduplicator, [b, c], header, index_path)
+    assert results == full_run(deduplicator, [b, c], header)
+    assert [result.duplicate_of_id for result in results] == ['', 'B']
+
+    # The promoted row's postings were saved: a later run still finds it in the blocks
+    d = {'Id': 'D', 'name': 'Zenith Tools', 'email': 'd@initech.com'}
+    results, _ = indexed_run(deduplicator, [b, c, d], header, index_path)
+    assert results == full_run(deduplicator, [b, c, d], header)
+    assert results[2].duplicate_of_id == 'B'
@@ -0,0 +1,33 @@
+import pytest
+
+import blankcheck
+from conftest import load_deduplicator
+
+@pytest.mark.parametrize('kind', ['contact', 'account'])
+@pytest.mark.parametrize('max_block_size', [None, 5])
+def test_workers_give_the_same_results_as_serial(kind, max_block_size, generated_rows, monkeypatch):
+    header, rows = generated_rows(kind, 1500, seed=3)
+    deduplicator = load_deduplicator(kind)
+    deduplicator.max_block_size = max_block_size
+    serial = list(deduplicator.process_records(rows, header, workers=1))
+
+    # Tiny tasks, so large blocks are split into row ranges scored in different processes
+    monkeypatch.setattr(blankcheck, 'PARALLEL_CHUNK_COMPARISONS', 50)
+    parallel = list(deduplicator.process_records(rows, header, workers=3))
+
+    assert parallel == serial
+    assert any(result.is_duplicate_or_matched for result in serial)
+
+def test_workers_break_ties_across_blocks_like_serial():
+    # Row 2 scores 50 against row 0 (shared 'b' block) and row 1 (shared 'a' block); the earliest row must win
+    deduplicator = blankcheck.Deduplicator({'a': 50, 'b': 50}, {'a': 'exact', 'b': 'exact'}, 50)
+    header = ['Id', 'a', 'b']
+    rows = [
+        {'Id': '0', 'a': 'kkkkk', 'b': 'bravo'},
+        {'Id': '1', 'a': 'alpha', 'b': 'qqqqq'},
+        {'Id': '2', 'a': 'alpha', 'b': 'bravo'},
+    ]
+    serial = list(deduplicator.process_records(rows, header, workers=1))
+    assert serial[2].duplicate_of_id == '0'
+    for _ in range(3):
+        assert list(deduplicator.process_records(rows, header, workers=2)) == serial
@@ -0,0 +1,25 @@
+from conftest import load_deduplicator
+
+def test_records_with_non_string_values_are_scored_like_their_csv_form(capsys):
+    deduplicator = load_deduplicator('account')
+    header = ['Id', 'Name', 'Website', 'Phone', 'NumberOfEmployees', 'IsDeleted', 'AnnualRevenue']
+    records = [
+        {'Id': '001A', 'Name': 'Acme Holdings Ltd', 'Website': 'acme.com', 'Phone': 441614960000, 'NumberOfEmployees': 50, 'IsDeleted': False, 'AnnualRevenue': None},
+        {'Id': '001B', 'Name': 'Acme Holdings Limited', 'Website': 'https://www.acme.com', 'Phone': '+44 161 496 0000', 'NumberOfEmployees': 51.5, 'IsDeleted': True, 'AnnualRevenue': 1000000},
+        {'Id': '001C', 'Name': None, 'Website': 'globex.com', 'Phone': None, 'NumberOfEmployees': None, 'IsDeleted': False, 'AnnualRevenue': 0},
+    ]
+    as_csv = [{key: "" if value is None else str(value) for key, value in record.items()} for record in records]
+
+    results = list(deduplicator.process_records(records, header))
+
+    assert results == list(deduplicator.process_records(as_csv, header))
+    assert [result.row for result in results] == as_csv
+    assert results[1].duplicate_of_id == '001A'
+    # A library call is quiet unless progress is turned on
+    assert capsys.readouterr() == ('', '')
+
+def test_progress_reports_the_passes(capsys):
+    deduplicator = load_deduplicator('contact')
+    deduplicator.progress = True
+    list(deduplicator.process_records([{'Id': '1', 'Name': 'Ann Lee', 'Email': 'ann@acme.com'}]))
+    assert "Pass 1" in capsys.readouterr().out
@@ -0,0 +1,41 @@
+import pytest
+
+import blankcheck
+from conftest import load_deduplicator
+
+def brute_force_reference_match(deduplicator, reference_records, reference_keys, record):
+    """Scores the record against every reference row sharing a block key with it, pair by pair."""
+    exact_key = deduplicator.get_exact_match_key(record)
+    if exact_key:
+        for reference_row, reference_record in enumerate(reference_records):
+            if deduplicator.get_exact_match_key(reference_record) == exact_key:
+                score, field_scores = deduplicator.score_pair(record, reference_record)
+                return score, reference_row, field_scores, 1
+    blocking_keys = set(deduplicator.get_blocking_keys(record))
+    scored = [(deduplicator.score_pair(record, reference_records[reference_row]), reference_row) for reference_row, keys in enumerate(reference_keys)
+              if not blocking_keys.isdisjoint(keys)]
+    matches = [(score, reference_row, field_scores) for (score, field_scores), reference_row in scored if score >= deduplicator.similarity_threshold]
+    if not matches:
+        return None
+    # The highest score wins, the earliest reference row on a tie
+    score, reference_row, field_scores = max(matches, key=lambda match: (match[0], -match[1]))
+    return score, reference_row, field_scores, len(matches)
+
+@pytest.mark.parametrize('kind', ['contact', 'account'])
+def test_reference_matches_equal_a_brute_force_scan(kind, generated_rows):
+    header, rows = generated_rows(kind, 1200, seed=9)
+    deduplicator = load_deduplicator(kind)
+    header_map = deduplicator.get_header_map(header)
+    # Later rows copy entities of earlier ones, so the second half has matches in the first
+    reference_rows, query_rows = rows[:600], rows[600:]
+    reference_index = deduplicator.build_reference_index(reference_rows, header)
+    reference_records = [blankcheck.normalize_record(row, header_map) for row in reference_rows]
+    reference_keys = [deduplicator.get_blocking_keys(reference_record) for reference_record in reference_records]
+
+    matched = 0
+    for row in query_rows:
+        record = blankcheck.normalize_record(row, header_map)
+        expected = brute_force_reference_match(deduplicator, reference_records, reference_keys, record)
+        assert deduplicator.match_reference_record(reference_index, record) == expected
+        matched += expected is not None
+    assert matched > 50
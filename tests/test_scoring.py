@@ -0,0 +1,84 @@
+import random
+
+import pytest
+from rapidfuzz import fuzz
+
+from blankcheck import Deduplicator
+
+FIELD_WEIGHTS = {
+    'sorted': {'name': 40, 'email': 30, 'company_name__c': 20, 'phone': 10},
+    'unsorted': {'phone': 10, 'name': 40, 'company_name__c': 20, 'email': 30},
+}
+WORDS = ['acme', 'acne', 'globex', 'global', 'john', 'jon', 'smith', 'smyth', 'ltd', 'inc', 'holdings', 'group', 'a', 'mary']
+
+def pairwise_best_match(field_weights, similarity_threshold, record, candidates):
+    """The unpruned scorer: every candidate scored field by field with token_set_ratio, as score_pair does."""
+    scores, field_scores = [], []
+    for candidate in candidates:
+        score, logged = 0.0, {}
+        for key, weight in field_weights.items():
+            if not record[key]:
+                continue
+            ratio = fuzz.token_set_ratio(record[key], candidate[key])
+            score += (ratio / 100.0) * weight
+            if candidate[key]:
+                logged[key] = int(ratio)
+        scores.append(score)
+        field_scores.append(logged)
+    max_score = max(scores, default=0)
+    if max_score < similarity_threshold:
+        return 0, None, None, ()
+    best_position = scores.index(max_score)  # The earliest candidate wins a tie
+    match_positions = [position for position, score in enumerate(scores) if score >= similarity_threshold]
+    return max_score, best_position, field_scores[best_position], match_positions
+
+def random_value(rng, key):
+    if rng.random() < 0.15:
+        return ""
+    if key == 'phone':
+        return ''.join(rng.choice('0123') for _ in range(rng.randint(6, 8)))
+    if key == 'email':
+        return f"{rng.choice(WORDS)}{rng.choice(['', '.', '_'])}{rng.choice(WORDS)}@{rng.choice(['acme.com', 'globex.com'])}"
+    return ' '.join(rng.choice(WORDS) for _ in range(rng.randint(1, 3)))
+
+def random_record(rng):
+    return {key: random_value(rng, key) for key in FIELD_WEIGHTS['sorted']}
+
+def candidate_columns(field_weights, candidates):
+    return {key: [candidate[key] for candidate in candidates] for key in field_weights}
+
+@pytest.mark.parametrize('order', ['sorted', 'unsorted'])
+@pytest.mark.parametrize('seed', range(40))
+def test_pruned_scorer_matches_pairwise_scoring(order, seed):
+    rng = random.Random(seed)
+    field_weights = FIELD_WEIGHTS[order]
+    record = random_record(rng)
+    candidates = [random_record(rng) for _ in range(rng.randint(1, 60))]
+    # Exact copies of one candidate make ties for the best score
+    candidates += [dict(rng.choice(candidates)) for _ in range(3)]
+    rng.shuffle(candidates)
+    # Thresholds exactly at a candidate's score as well as fixed ones
+    reachable = sorted({pairwise_best_match(field_weights, 0, record, [candidate])[0] for candidate in candidates})
+    for similarity_threshold in [50, 80, rng.choice(reachable), reachable[-1]]:
+        deduplicator = Deduplicator(field_weights, {'name': 'exact'}, similarity_threshold)
+        expected = pairwise_best_match(field_weights, similarity_threshold, record, candidates)
+        assert deduplicator.find_best_match(record, candidate_columns(field_weights, candidates)) == expected
+
+@pytest.mark.parametrize('order', ['sorted', 'unsorted'])
+def test_pruned_scorer_matches_pairwise_scoring_on_multithreaded_batches(order):
+    # Batches of PARALLEL_SCORING_MIN_CANDIDATES or more are scored by rapidfuzz on all cores
+    rng = random.Random(1)
+    field_weights = FIELD_WEIGHTS[order]
+    record = {'name': 'acme holdings', 'email': 'john.smith@acme.com', 'company_name__c': 'acme', 'phone': '0123012'}
+    candidates = [random_record(rng) for _ in range(1500)] + [dict(record), dict(record)]
+    deduplicator = Deduplicator(field_weights, {'name': 'exact'}, 60)
+    expected = pairwise_best_match(field_weights, 60, record, candidates)
+    assert expected[0] == 100
+    assert deduplicator.find_best_match(record, candidate_columns(field_weights, candidates)) == expected
+
+def test_pruned_scorer_returns_no_match_below_threshold():
+    field_weights = FIELD_WEIGHTS['sorted']
+    deduplicator = Deduplicator(field_weights, {'name': 'exact'}, 80)
+    record = {'name': 'acme', 'email': '', 'company_name__c': '', 'phone': ''}
+    candidates = [{'name': 'globex', 'email': 'a@b.com', 'company_name__c': 'x', 'phone': '123456'}]
+    assert deduplicator.find_best_match(record, candidate_columns(field_weights, candidates)) == (0, None, None, ())
@@ -0,0 +1,36 @@
+import pytest
+
+import blankcheck
+from conftest import load_deduplicator
+
+def pass1_result(row_ids, best_matches, match_clusters, completeness):
+    clusters = {root: list(members) for root, members in match_clusters.clusters().items()}
+    return row_ids, best_matches, clusters, [completeness(i) for i in range(len(row_ids))]
+
+@pytest.mark.parametrize('kind', ['contact', 'account'])
+@pytest.mark.parametrize('max_block_size', [None, 5])
+@pytest.mark.parametrize('workers', [1, 2])
+def test_sharded_pass1_matches_in_memory_pass1(kind, max_block_size, workers, generated_rows, tmp_path, monkeypatch):
+    header, rows = generated_rows(kind, 2000, seed=7)
+    deduplicator = load_deduplicator(kind)
+    deduplicator.max_block_size = max_block_size
+    header_map = deduplicator.get_header_map(header)
+    expected = pass1_result(*deduplicator.find_matches(rows, header_map))
+
+    # Every partition becomes a shard of its own, so rows and blocks are spread over many shards
+    monkeypatch.setattr(blankcheck, 'SPILL_MEMORY_FACTOR', 10 ** 6)
+    sharded = pass1_result(*deduplicator.find_matches_sharded(rows, header_map, 1, workers, spill_dir=str(tmp_path)))
+
+    assert sharded == expected
+    assert expected[1], "the generated data should contain duplicates"
+
+def test_spill_files_do_not_stay_open(tmp_path, monkeypatch):
+    monkeypatch.setattr(blankcheck, 'SPILL_BATCH_ENTRIES', 2)
+    spill = blankcheck.SpillFiles(str(tmp_path / 'block'), 4)
+    entries = [(i, [f"name:{i % 3}"], None, (str(i),)) for i in range(20)]
+    for entry in entries:
+        spill.add(spill.partition_of(entry[1][0]), entry)
+    spill.close()
+    read_back = list(spill.read_merged(range(4)))
+    assert [entry[0] for entry in read_back] == list(range(20))
+    assert sorted(read_back) == entries